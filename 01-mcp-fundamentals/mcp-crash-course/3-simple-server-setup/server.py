@@ -1,6 +1,8 @@
 from mcp.server.fastmcp import FastMCP
 from dotenv import load_dotenv
 
+from tool_cache import cached_tool, register_metrics_resource
+
 load_dotenv("../.env")
 
 # Create an MCP server
@@ -12,13 +14,18 @@ mcp = FastMCP(
 )
 
 
-# Add a simple calculator tool
-@mcp.tool()
+# Add a simple calculator tool. Its result only depends on its arguments,
+# so repeated calls are served from the tool result cache.
+@cached_tool(mcp, ttl=None, max_entries=1024)
 def add(a: int, b: int) -> int:
     """Add two numbers together"""
     return a + b
 
 
+# Expose cache hit/miss/eviction counts as a resource
+register_metrics_resource(mcp)
+
+
 # Run the server
 if __name__ == "__main__":
     transport = "stdio"
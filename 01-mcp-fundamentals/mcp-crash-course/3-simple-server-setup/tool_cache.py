@@ -0,0 +1,191 @@
+"""
+Result caching for deterministic MCP tools.
+
+Agents often call the same tool with the same arguments over and over.
+Register such tools with `cached_tool` instead of `mcp.tool()` and repeated
+calls are answered from an in-process TTL + LRU cache:
+
+    @cached_tool(mcp, ttl=300, max_entries=1024)
+    def add(a: int, b: int) -> int:
+        return a + b
+
+Hit, miss, eviction and expiration counts for every cached tool are exposed
+through `register_metrics_resource`.
+
+This file is copied into 3-simple-server-setup and 02.1-build_your_own_server
+so each example folder runs on its own; keep the copies identical.
+"""
+
+import functools
+import inspect
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Cache instances by tool name, used for metrics
+tool_caches: Dict[str, "ToolResultCache"] = {}
+
+_MISSING = object()
+
+
+class ToolResultCache:
+    """LRU cache of tool results with an optional time-to-live.
+
+    Entries are evicted least recently used first once `max_entries` or
+    `max_bytes` (measured on the JSON-encoded result) is exceeded.
+    """
+
+    def __init__(
+        self,
+        ttl: Optional[float] = 300.0,
+        max_entries: Optional[int] = 1024,
+        max_bytes: Optional[int] = None,
+    ):
+        """Initialize the cache.
+
+        Args:
+            ttl: Seconds a result stays valid, or None to never expire.
+            max_entries: Maximum number of cached results, or None for no limit.
+            max_bytes: Maximum total size of cached results, or None for no limit.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Any:
+        """Return the cached result for `key`, or `_MISSING`."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return _MISSING
+            value, expires_at, size = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: Any) -> None:
+        """Store a result, evicting least recently used entries as needed."""
+        size = len(json.dumps(value, default=str).encode("utf-8"))
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else float("inf")
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+            while self._entries and (
+                (self.max_entries is not None and len(self._entries) > self.max_entries)
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return hit, miss, eviction and size counters."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+
+def cache_key(signature: inspect.Signature, args: tuple, kwargs: dict) -> str:
+    """Build a canonical key from call arguments.
+
+    Positional and keyword forms of the same call, and calls that rely on
+    default values, map to the same key.
+    """
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    return json.dumps(bound.arguments, sort_keys=True, default=repr, separators=(",", ":"))
+
+
+def cached_tool(
+    mcp: Any,
+    ttl: Optional[float] = 300.0,
+    max_entries: Optional[int] = 1024,
+    max_bytes: Optional[int] = None,
+    **tool_kwargs: Any,
+) -> Callable[[Callable], Callable]:
+    """Register a function as an MCP tool whose results are cached.
+
+    Only use this for tools whose result depends on nothing but their
+    arguments. Exceptions are not cached.
+
+    Args:
+        mcp: The FastMCP server to register the tool on.
+        ttl: Seconds a result stays valid, or None to never expire.
+        max_entries: Maximum number of cached results for this tool.
+        max_bytes: Maximum total size of cached results for this tool.
+        **tool_kwargs: Passed through to `mcp.tool()`, e.g. `name`.
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        name = tool_kwargs.get("name") or fn.__name__
+        cache = ToolResultCache(ttl=ttl, max_entries=max_entries, max_bytes=max_bytes)
+        tool_caches[name] = cache
+        signature = inspect.signature(fn)
+
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                key = cache_key(signature, args, kwargs)
+                value = cache.get(key)
+                if value is _MISSING:
+                    value = await fn(*args, **kwargs)
+                    cache.put(key, value)
+                return value
+
+        else:
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                key = cache_key(signature, args, kwargs)
+                value = cache.get(key)
+                if value is _MISSING:
+                    value = fn(*args, **kwargs)
+                    cache.put(key, value)
+                return value
+
+        mcp.tool(**tool_kwargs)(wrapper)
+        return wrapper
+
+    return decorator
+
+
+def cache_metrics() -> Dict[str, Dict[str, Any]]:
+    """Return the metrics of every cached tool, keyed by tool name."""
+    return {name: cache.metrics() for name, cache in tool_caches.items()}
+
+
+def register_metrics_resource(mcp: Any, uri: str = "metrics://tool-cache") -> None:
+    """Expose `cache_metrics()` as a JSON resource on the server."""
+
+    @mcp.resource(uri)
+    def tool_cache_metrics() -> str:
+        """Hit, miss and eviction counts of cached tools as JSON."""
+        return json.dumps(cache_metrics(), indent=2)
@@ -1,14 +1,18 @@
 import asyncio
 import json
+import time
 from contextlib import AsyncExitStack
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
 
 import nest_asyncio
 from dotenv import load_dotenv
-from mcp import ClientSession, StdioServerParameters
+from mcp import StdioServerParameters, types
 from mcp.client.stdio import stdio_client
+from mcp.client.streamable_http import streamablehttp_client
 from openai import AsyncOpenAI
 
+from session_pool import MCPSessionPool
+
 # Apply nest_asyncio to allow nested event loops (needed for Jupyter/IPython)
 nest_asyncio.apply()
 
@@ -19,58 +23,104 @@ load_dotenv("../.env")
 class MCPOpenAIClient:
     """Client for interacting with OpenAI models using MCP tools."""
 
-    def __init__(self, model: str = "gpt-4o"):
+    def __init__(
+        self,
+        model: str = "gpt-4o",
+        max_concurrency: int = 8,
+        tool_timeout: Optional[float] = 30.0,
+        max_rounds: int = 5,
+        max_total_tokens: Optional[int] = None,
+        max_seconds: Optional[float] = None,
+    ):
         """Initialize the OpenAI MCP client.
 
         Args:
             model: The OpenAI model to use.
+            max_concurrency: Maximum number of tool calls running at once.
+            tool_timeout: Seconds to wait for a single tool call, or None to wait forever.
+            max_rounds: Maximum number of tool-calling rounds per query.
+            max_total_tokens: Token budget per query across all OpenAI calls, or None.
+            max_seconds: Wall-clock budget per query in seconds, or None.
         """
-        # Initialize session and client objects
-        self.session: Optional[ClientSession] = None
+        # Initialize session pool and client objects
+        self.pool: Optional[MCPSessionPool] = None
         self.exit_stack = AsyncExitStack()
         self.openai_client = AsyncOpenAI()
         self.model = model
-        self.stdio: Optional[Any] = None
-        self.write: Optional[Any] = None
-
-    async def connect_to_server(self, server_script_path: str = "server.py"):
-        """Connect to an MCP server.
+        self.server_name: Optional[str] = None
+        # OpenAI-format tool schemas per server, dropped on tools/list_changed
+        self._tools_cache: Dict[str, List[Dict[str, Any]]] = {}
+        self.tool_timeout = tool_timeout
+        self._tool_semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_rounds = max_rounds
+        self.max_total_tokens = max_total_tokens
+        self.max_seconds = max_seconds
+
+    async def connect_to_server(self, server_script_path: str = "server.py", pool_size: int = 1):
+        """Connect to an MCP server over stdio.
 
         Args:
             server_script_path: Path to the server script.
+            pool_size: Number of server processes to spawn. Concurrent
+                queries are spread over them, least busy first.
         """
         # Server configuration
         server_params = StdioServerParameters(
             command="python",
             args=[server_script_path],
         )
+        await self._connect(server_script_path, lambda: stdio_client(server_params), pool_size)
 
-        # Connect to the server
-        stdio_transport = await self.exit_stack.enter_async_context(
-            stdio_client(server_params)
-        )
-        self.stdio, self.write = stdio_transport
-        self.session = await self.exit_stack.enter_async_context(
-            ClientSession(self.stdio, self.write)
-        )
+    async def connect_to_http_server(self, url: str = "http://localhost:8050/mcp", pool_size: int = 1):
+        """Connect to an MCP server over Streamable HTTP.
+
+        Args:
+            url: The server's MCP endpoint.
+            pool_size: Number of HTTP sessions to open.
+        """
+        await self._connect(url, lambda: streamablehttp_client(url), pool_size)
 
-        # Initialize the connection
-        await self.session.initialize()
+    async def _connect(self, server_name: str, connect: Any, pool_size: int):
+        # Connect to the server and initialize every session in the pool
+        self.server_name = server_name
+        self.pool = await self.exit_stack.enter_async_context(
+            MCPSessionPool(connect, size=pool_size, message_handler=self._handle_message)
+        )
 
         # List available tools
-        tools_result = await self.session.list_tools()
+        tools = await self.get_mcp_tools()
         print("\nConnected to server with tools:")
-        for tool in tools_result.tools:
-            print(f"  - {tool.name}: {tool.description}")
+        for tool in tools:
+            print(f"  - {tool['function']['name']}: {tool['function']['description']}")
+
+    async def _handle_message(self, message: Any) -> None:
+        """Handle incoming server messages.
+
+        Args:
+            message: A server request, notification or exception.
+        """
+        if isinstance(message, types.ServerNotification) and isinstance(
+            message.root, types.ToolListChangedNotification
+        ):
+            self._tools_cache.pop(self.server_name, None)
 
     async def get_mcp_tools(self) -> List[Dict[str, Any]]:
         """Get available tools from the MCP server in OpenAI format.
 
+        The converted tools are cached per server, so `list_tools` is only
+        called again after the server sends a `tools/list_changed`
+        notification.
+
         Returns:
             A list of tools in OpenAI format.
         """
-        tools_result = await self.session.list_tools()
-        return [
+        cached = self._tools_cache.get(self.server_name)
+        if cached is not None:
+            return cached
+
+        async with self.pool.acquire() as session:
+            tools_result = await session.list_tools()
+        tools = [
             {
                 "type": "function",
                 "function": {
@@ -81,67 +131,197 @@ class MCPOpenAIClient:
             }
             for tool in tools_result.tools
         ]
+        self._tools_cache[self.server_name] = tools
+        return tools
 
-    async def process_query(self, query: str) -> str:
-        """Process a query using OpenAI and available MCP tools.
+    async def call_tool(self, tool_call: Any, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Execute one tool call requested by OpenAI.
+
+        Failures and timeouts are returned as the tool message content, so
+        one failing tool does not cancel the other calls of the same turn.
 
         Args:
-            query: The user query.
+            tool_call: A tool call from the assistant message.
+            timeout: Seconds to wait, defaults to `tool_timeout`.
 
         Returns:
-            The response from OpenAI.
+            The tool message to add to the conversation.
         """
-        # Get available tools
-        tools = await self.get_mcp_tools()
+        name = tool_call.function.name
+        timeout = self.tool_timeout if timeout is None else timeout
+
+        async def call() -> Any:
+            # Waiting for a free slot and acquiring a session (which may
+            # replace a dead one) both count toward the timeout
+            async with self._tool_semaphore:
+                async with self.pool.acquire() as session:
+                    return await session.call_tool(
+                        name,
+                        arguments=json.loads(tool_call.function.arguments),
+                    )
+
+        try:
+            result = await asyncio.wait_for(call(), timeout=timeout)
+            content = result.content[0].text
+        except asyncio.TimeoutError:
+            content = f"Error: Tool {name} timed out after {timeout} seconds"
+        except Exception as e:
+            content = f"Error: {str(e)}"
+
+        return {
+            "role": "tool",
+            "tool_call_id": tool_call.id,
+            "content": content,
+        }
+
+    def _budget_exceeded(self, rounds: int, tokens: int, started: float) -> Optional[str]:
+        """Return the name of the first exhausted budget, if any."""
+        if rounds >= self.max_rounds:
+            return "max_rounds"
+        if self.max_total_tokens is not None and tokens >= self.max_total_tokens:
+            return "max_total_tokens"
+        if self.max_seconds is not None and time.monotonic() - started >= self.max_seconds:
+            return "max_seconds"
+        return None
+
+    async def stream_query(self, query: str) -> AsyncIterator[Dict[str, Any]]:
+        """Process a query with repeated tool-calling rounds, yielding progress.
+
+        Each round sends the conversation to OpenAI and runs any requested
+        tool calls. Once a budget (rounds, tokens or wall-clock time) runs
+        out, one last call is made with `tool_choice="none"` so the model
+        answers with what it has.
 
-        # Initial OpenAI API call
-        response = await self.openai_client.chat.completions.create(
-            model=self.model,
-            messages=[{"role": "user", "content": query}],
-            tools=tools,
-            tool_choice="auto",
-        )
+        Args:
+            query: The user query.
 
-        # Get assistant's response
-        assistant_message = response.choices[0].message
+        Yields:
+            Events with a "type" of "tool_calls", "tool_result" or "final".
+            The "final" event carries the answer and the "stop_reason".
+        """
+        # Get available tools
+        tools = await self.get_mcp_tools()
 
-        # Initialize conversation with user query and assistant response
-        messages = [
-            {"role": "user", "content": query},
-            assistant_message,
-        ]
+        messages: List[Any] = [{"role": "user", "content": query}]
+        started = time.monotonic()
+        rounds = 0
+        tokens = 0
 
-        # Handle tool calls if present
-        if assistant_message.tool_calls:
-            # Process each tool call
-            for tool_call in assistant_message.tool_calls:
-                # Execute tool call
-                result = await self.session.call_tool(
-                    tool_call.function.name,
-                    arguments=json.loads(tool_call.function.arguments),
-                )
-
-                # Add tool response to conversation
-                messages.append(
-                    {
-                        "role": "tool",
-                        "tool_call_id": tool_call.id,
-                        "content": result.content[0].text,
-                    }
-                )
-
-            # Get final response from OpenAI with tool results
-            final_response = await self.openai_client.chat.completions.create(
+        while True:
+            stop_reason = self._budget_exceeded(rounds, tokens, started)
+            response = await self.openai_client.chat.completions.create(
                 model=self.model,
                 messages=messages,
                 tools=tools,
-                tool_choice="none",  # Don't allow more tool calls
+                tool_choice="none" if stop_reason else "auto",
+            )
+            if response.usage is not None:
+                tokens += response.usage.total_tokens
+
+            # Get assistant's response
+            assistant_message = response.choices[0].message
+            messages.append(assistant_message)
+
+            if stop_reason or not assistant_message.tool_calls:
+                yield {
+                    "type": "final",
+                    "content": assistant_message.content,
+                    "stop_reason": stop_reason or "completed",
+                    "rounds": rounds,
+                    "total_tokens": tokens,
+                }
+                return
+
+            rounds += 1
+            yield {
+                "type": "tool_calls",
+                "round": rounds,
+                "content": assistant_message.content,
+                "tool_calls": [
+                    {"id": tc.id, "name": tc.function.name, "arguments": tc.function.arguments}
+                    for tc in assistant_message.tool_calls
+                ],
+            }
+
+            # Never let a tool run past the wall-clock budget
+            timeout = self.tool_timeout
+            if self.max_seconds is not None:
+                remaining = max(self.max_seconds - (time.monotonic() - started), 0.0)
+                timeout = remaining if timeout is None else min(timeout, remaining)
+
+            # Run the tool calls concurrently; gather keeps them in tool_call order
+            tool_messages = await asyncio.gather(
+                *(self.call_tool(tool_call, timeout) for tool_call in assistant_message.tool_calls)
             )
+            for tool_call, tool_message in zip(assistant_message.tool_calls, tool_messages):
+                yield {
+                    "type": "tool_result",
+                    "round": rounds,
+                    "tool_call_id": tool_message["tool_call_id"],
+                    "name": tool_call.function.name,
+                    "content": tool_message["content"],
+                }
+
+            # Add tool responses to conversation
+            messages.extend(tool_messages)
 
-            return final_response.choices[0].message.content
+    async def process_query(self, query: str) -> str:
+        """Process a query using OpenAI and available MCP tools.
 
-        # No tool calls, just return the direct response
-        return assistant_message.content
+        Args:
+            query: The user query.
+
+        Returns:
+            The response from OpenAI.
+        """
+        async for event in self.stream_query(query):
+            if event["type"] == "final":
+                return event["content"]
+        return ""
+
+    async def process_queries(
+        self, queries: Iterable[str], max_concurrency: int = 16
+    ) -> AsyncIterator[Tuple[int, str, Union[str, Exception]]]:
+        """Process many queries concurrently over the shared connections.
+
+        A fixed number of workers pull queries from `queries` as they go, so
+        large (or lazily generated) query sets are never materialized.
+
+        Args:
+            queries: The user queries.
+            max_concurrency: Maximum number of queries in flight at once.
+
+        Yields:
+            (index, query, result) tuples in completion order. `result` is
+            the response text, or the exception raised for that query.
+        """
+        results: asyncio.Queue = asyncio.Queue()
+        pending = iter(enumerate(queries))
+
+        async def worker():
+            try:
+                for i, query in pending:
+                    try:
+                        result = await self.process_query(query)
+                    except Exception as e:
+                        result = e
+                    await results.put((i, query, result))
+            finally:
+                await results.put(None)
+
+        workers = [asyncio.create_task(worker()) for _ in range(max(max_concurrency, 1))]
+        try:
+            running = len(workers)
+            while running:
+                item = await results.get()
+                if item is None:
+                    running -= 1
+                else:
+                    yield item
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
 
     async def cleanup(self):
         """Clean up resources."""
@@ -0,0 +1,773 @@
+"""
+Knowledge base loading and search for the Knowledge Base MCP server.
+
+The Knowledge Base server loads `data/kb.json` once at startup into a
+`KnowledgeBase`, so tools can search or format the Q&A pairs without
+re-reading and re-parsing the file on every call. A background watcher
+picks up edits to the file and swaps in a freshly built index.
+
+Two index backends are available:
+
+- `KBIndex`: an in-memory BM25 inverted index (the default)
+- `SqliteKBIndex`: an on-disk SQLite FTS5 index for corpora that do not fit
+  comfortably in memory
+
+Both are fed by `iter_json_items`, which streams JSON arrays and JSON Lines
+files item by item instead of decoding the whole document at once.
+"""
+
+import base64
+import binascii
+import codecs
+import json
+import math
+import mmap
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+WHITESPACE_RE = re.compile(r"[ \t\r\n]*")
+MAX_PAGE_SIZE = 100
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase alphanumeric terms."""
+    return TOKEN_RE.findall(text.lower())
+
+
+@dataclass(frozen=True)
+class KBEntry:
+    """A single Q&A pair from the knowledge base."""
+
+    question: str
+    answer: str
+
+
+def entry_from_item(i: int, item: Any) -> KBEntry:
+    """Convert one decoded JSON item into an entry.
+
+    Args:
+        i: The 1-based position of the item in the file.
+        item: The decoded item.
+
+    Returns:
+        The entry. Non-dict items keep their string form as the answer.
+    """
+    if isinstance(item, dict):
+        question = item.get("question", "Unknown question")
+        answer = item.get("answer", "Unknown answer")
+    else:
+        question = f"Item {i}"
+        answer = str(item)
+    return KBEntry(str(question), str(answer))
+
+
+def parse_entries(kb_data: Any) -> List[KBEntry]:
+    """Convert the parsed JSON knowledge base into a list of entries.
+
+    Args:
+        kb_data: The decoded contents of `kb.json`.
+
+    Returns:
+        One entry per item, or an empty list if the data is not a list.
+    """
+    if not isinstance(kb_data, list):
+        return []
+    return [entry_from_item(i, item) for i, item in enumerate(kb_data, 1)]
+
+
+class NotJSONArrayError(ValueError):
+    """Raised when a JSON knowledge base file is not a top-level array."""
+
+
+def iter_json_items(path: str, chunk_size: int = 1 << 20) -> Iterator[Any]:
+    """Yield the items of a JSON array or JSON Lines file one at a time.
+
+    JSON arrays are read through a memory map and decoded incrementally, so
+    only the current chunk and the item being decoded are held in memory.
+    Files ending in `.jsonl` or `.ndjson` are read line by line.
+
+    Args:
+        path: Path to the knowledge base file.
+        chunk_size: Number of bytes decoded per read.
+
+    Raises:
+        NotJSONArrayError: If a `.json` file does not hold a top-level array.
+        json.JSONDecodeError: If the file is not valid JSON.
+    """
+    if path.endswith((".jsonl", ".ndjson")):
+        with open(path, "r") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        return
+
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise json.JSONDecodeError("Expecting value", "", 0)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield from _iter_array_items(mm, chunk_size)
+
+
+def _is_truncation(error: json.JSONDecodeError, buffered: int) -> bool:
+    """Return True if a decode error may only mean the input was cut off."""
+    # An unterminated string reports where the string starts, however long
+    # it is; other errors from cut-off input (a partial literal, number or
+    # \uXXXX escape) point within a few characters of the end
+    return error.msg.startswith("Unterminated string") or error.pos >= buffered - 8
+
+
+def _iter_array_items(mm: mmap.mmap, chunk_size: int) -> Iterator[Any]:
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8-sig")()
+    buf = ""
+    pos = 0
+    offset = 0
+    size = len(mm)
+
+    def fill(read_size: int = chunk_size) -> bool:
+        nonlocal buf, pos, offset
+        if offset >= size:
+            return False
+        chunk = mm[offset : offset + read_size]
+        offset += len(chunk)
+        buf = buf[pos:] + utf8.decode(chunk, final=offset >= size)
+        pos = 0
+        return True
+
+    def next_char() -> str:
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            if not fill():
+                return ""
+
+    if next_char() != "[":
+        raise NotJSONArrayError("Knowledge base file is not a JSON array")
+    pos += 1
+
+    # After "[" an item or "]" may follow, after an item "," or "]",
+    # and after "," only another item.
+    state = "first"
+    while True:
+        char = next_char()
+        if char == "":
+            raise json.JSONDecodeError("Unterminated array", buf, pos)
+        if state != "item" and char == "]":
+            pos += 1
+            if next_char() != "":
+                raise json.JSONDecodeError("Extra data", buf, pos)
+            return
+        if state == "separator":
+            if char != ",":
+                raise json.JSONDecodeError("Expecting ',' delimiter", buf, pos)
+            pos += 1
+            state = "item"
+            continue
+
+        # An item spanning many chunks reads twice as much on every retry,
+        # so decoding it stays linear in its size
+        read_size = chunk_size
+        while True:
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError as e:
+                # Only an item cut off at the end of the buffer is worth
+                # reading more for; a syntax error inside it is raised now
+                # instead of pulling the rest of the file into memory
+                if not _is_truncation(e, len(buf)) or not fill(read_size):
+                    raise
+                read_size *= 2
+                continue
+            # A number cut off by the chunk boundary decodes as a shorter
+            # number ("1.5e" as 1.5), so only accept the item once its
+            # delimiter is visible. Anything else before the next delimiter
+            # is a syntax error, raised by the separator check below.
+            after = WHITESPACE_RE.match(buf, end).end()
+            cut_off = after == len(buf) or (
+                buf[after] not in ",]" and buf.find(",", after) == -1 and buf.find("]", after) == -1
+            )
+            if cut_off and fill(read_size):
+                read_size *= 2
+                continue
+            break
+        pos = end
+        state = "separator"
+        yield item
+
+
+def encode_cursor(position: int) -> str:
+    """Encode a position as an opaque page cursor."""
+    return base64.urlsafe_b64encode(json.dumps({"p": position}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """Decode a page cursor back into a position.
+
+    Raises:
+        ValueError: If the cursor was not produced by `encode_cursor`.
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        position = data["p"]
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, KeyError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    if not isinstance(position, int) or position < 0:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return position
+
+
+def format_entries(entries: Iterable[Tuple[int, KBEntry]], header: str) -> str:
+    """Format numbered entries as a Q&A block.
+
+    Args:
+        entries: (number, entry) pairs to format.
+        header: Text placed before the Q&A pairs.
+
+    Returns:
+        The formatted string.
+    """
+    parts = [header]
+    for i, entry in entries:
+        parts.append(f"Q{i}: {entry.question}\nA{i}: {entry.answer}\n\n")
+    return "".join(parts)
+
+
+class KBIndex:
+    """Immutable BM25 index over a list of knowledge base entries.
+
+    Postings are stored per term as two parallel arrays (document ids and
+    term frequencies), which keeps the index compact for large corpora.
+    An index is never modified after construction; reloads build a new one
+    and swap the reference, so readers always see a complete index.
+    """
+
+    def __init__(
+        self,
+        entries: List[KBEntry],
+        raw_data: Any = None,
+        previous: Optional["KBIndex"] = None,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        """Build the index.
+
+        Args:
+            entries: The Q&A pairs to index.
+            raw_data: Non-list JSON content, kept for formatting only.
+            previous: An older index whose term counts are reused for
+                entries with an unchanged question and answer.
+            k1: BM25 term frequency saturation.
+            b: BM25 document length normalization.
+        """
+        self.entries = entries
+        self.raw_data = raw_data
+        self.k1 = k1
+        self.b = b
+        self.reused = 0
+
+        previous_docs = previous.doc_ids_by_question() if previous is not None else {}
+
+        postings: Dict[str, Tuple[array, array]] = {}
+        doc_lengths = array("I")
+        doc_terms: List[Tuple[Tuple[str, int], ...]] = []
+        for doc_id, entry in enumerate(entries):
+            old_id = previous_docs.get(entry.question)
+            if old_id is not None and previous.entries[old_id].answer == entry.answer:
+                terms = previous.doc_terms[old_id]
+                self.reused += 1
+            else:
+                terms = tuple(Counter(tokenize(f"{entry.question} {entry.answer}")).items())
+            doc_terms.append(terms)
+            doc_lengths.append(sum(tf for _, tf in terms))
+            for term, tf in terms:
+                if term not in postings:
+                    postings[term] = (array("I"), array("I"))
+                doc_ids, tfs = postings[term]
+                doc_ids.append(doc_id)
+                tfs.append(tf)
+
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.doc_terms = doc_terms
+        self.avg_doc_length = (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def iter_entries(self) -> Iterator[Tuple[int, KBEntry]]:
+        """Yield (doc_id, entry) pairs in file order."""
+        return enumerate(self.entries)
+
+    def entry_at(self, doc_id: int) -> Optional[KBEntry]:
+        """Return the entry with the given document id, if any."""
+        return self.entries[doc_id] if 0 <= doc_id < len(self.entries) else None
+
+    def page(self, start: int, limit: int) -> List[Tuple[int, KBEntry]]:
+        """Return up to `limit` (doc_id, entry) pairs starting at `start`."""
+        return list(enumerate(self.entries[start : start + limit], start))
+
+    def doc_ids_by_question(self) -> Dict[str, int]:
+        """Map each question to its document id."""
+        return {entry.question: doc_id for doc_id, entry in enumerate(self.entries)}
+
+    def idf(self, term: str) -> float:
+        """Return the BM25 inverse document frequency of a term."""
+        df = len(self.postings[term][0]) if term in self.postings else 0
+        n = len(self.entries)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[int, KBEntry, float]]:
+        """Return the top-k entries for a query.
+
+        Args:
+            query: Free-text search query.
+            k: Maximum number of results.
+
+        Returns:
+            (doc_id, entry, score) tuples sorted by descending score.
+        """
+        scores: Dict[int, float] = {}
+        avg = self.avg_doc_length or 1.0
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            idf = self.idf(term)
+            doc_ids, tfs = self.postings[term]
+            for doc_id, tf in zip(doc_ids, tfs):
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        top = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[: max(k, 0)]
+        return [(doc_id, self.entries[doc_id], score) for doc_id, score in top]
+
+
+class SqliteKBIndex:
+    """On-disk knowledge base index backed by SQLite FTS5.
+
+    Entries are streamed into the database, so memory use is bounded by the
+    largest single entry rather than by the size of the corpus. Entries are
+    keyed by question. A reload diffs the file against the stored rows inside
+    one transaction, and WAL mode lets readers keep using the previous
+    snapshot until that transaction commits.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS entries (
+        id INTEGER PRIMARY KEY,
+        question TEXT NOT NULL UNIQUE,
+        answer TEXT NOT NULL,
+        position INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS entries_position ON entries(position);
+    CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+        question, answer, content='entries', content_rowid='id'
+    );
+    CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+    """
+
+    raw_data = None
+
+    def __init__(self, db_path: str, batch_size: int = 1000):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self._local = threading.local()
+        conn = self._connect()
+        try:
+            conn.executescript(self.SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._reader().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def __len__(self) -> int:
+        return int(self._meta("entries") or 0)
+
+    def source_signature(self) -> Optional[str]:
+        """Return the signature of the file the index was last built from."""
+        return self._meta("signature")
+
+    def ingest(self, entries: Iterable[KBEntry], signature: str) -> Dict[str, int]:
+        """Bring the index in line with a stream of entries.
+
+        An empty index is bulk loaded and the full-text index rebuilt once.
+        Otherwise each entry is compared with the stored row for its question
+        and only new or changed rows are written.
+
+        Args:
+            entries: The entries in file order.
+            signature: Identifies the source file version, stored for reuse.
+
+        Returns:
+            Counts of added, changed, removed and unchanged entries.
+        """
+        counts = {"added": 0, "changed": 0, "removed": 0, "unchanged": 0}
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            empty = conn.execute("SELECT NOT EXISTS (SELECT 1 FROM entries)").fetchone()[0]
+            if empty:
+                self._bulk_load(conn, entries, counts)
+            else:
+                self._apply_diff(conn, entries, counts)
+            total = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            conn.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [("signature", signature), ("entries", str(total))],
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return counts
+
+    def _bulk_load(self, conn: sqlite3.Connection, entries: Iterable[KBEntry], counts: Dict[str, int]) -> None:
+        sql = (
+            "INSERT INTO entries (question, answer, position) VALUES (?, ?, ?) "
+            "ON CONFLICT(question) DO UPDATE SET answer = excluded.answer, position = excluded.position"
+        )
+        batch = []
+        for position, entry in enumerate(entries):
+            batch.append((entry.question, entry.answer, position))
+            if len(batch) >= self.batch_size:
+                conn.executemany(sql, batch)
+                batch.clear()
+        if batch:
+            conn.executemany(sql, batch)
+        counts["added"] = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        conn.execute("INSERT INTO entries_fts (entries_fts) VALUES ('rebuild')")
+
+    def _apply_diff(self, conn: sqlite3.Connection, entries: Iterable[KBEntry], counts: Dict[str, int]) -> None:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS seen (question TEXT PRIMARY KEY)")
+        conn.execute("DELETE FROM seen")
+
+        for position, entry in enumerate(entries):
+            conn.execute("INSERT OR IGNORE INTO seen (question) VALUES (?)", (entry.question,))
+            row = conn.execute(
+                "SELECT id, answer, position FROM entries WHERE question = ?", (entry.question,)
+            ).fetchone()
+            if row is None:
+                cursor = conn.execute(
+                    "INSERT INTO entries (question, answer, position) VALUES (?, ?, ?)",
+                    (entry.question, entry.answer, position),
+                )
+                conn.execute(
+                    "INSERT INTO entries_fts (rowid, question, answer) VALUES (?, ?, ?)",
+                    (cursor.lastrowid, entry.question, entry.answer),
+                )
+                counts["added"] += 1
+            elif row[1] != entry.answer:
+                doc_id, old_answer, _ = row
+                conn.execute(
+                    "INSERT INTO entries_fts (entries_fts, rowid, question, answer) VALUES ('delete', ?, ?, ?)",
+                    (doc_id, entry.question, old_answer),
+                )
+                conn.execute(
+                    "UPDATE entries SET answer = ?, position = ? WHERE id = ?",
+                    (entry.answer, position, doc_id),
+                )
+                conn.execute(
+                    "INSERT INTO entries_fts (rowid, question, answer) VALUES (?, ?, ?)",
+                    (doc_id, entry.question, entry.answer),
+                )
+                counts["changed"] += 1
+            else:
+                if row[2] != position:
+                    conn.execute("UPDATE entries SET position = ? WHERE id = ?", (position, row[0]))
+                counts["unchanged"] += 1
+
+        removed = conn.execute(
+            "SELECT id, question, answer FROM entries WHERE question NOT IN (SELECT question FROM seen)"
+        ).fetchall()
+        for doc_id, question, answer in removed:
+            conn.execute(
+                "INSERT INTO entries_fts (entries_fts, rowid, question, answer) VALUES ('delete', ?, ?, ?)",
+                (doc_id, question, answer),
+            )
+            conn.execute("DELETE FROM entries WHERE id = ?", (doc_id,))
+        counts["removed"] = len(removed)
+        conn.execute("DELETE FROM seen")
+
+    def iter_entries(self) -> Iterator[Tuple[int, KBEntry]]:
+        """Yield (position, entry) pairs in file order."""
+        conn = self._connect()
+        try:
+            cursor = conn.execute("SELECT position, question, answer FROM entries ORDER BY position")
+            for position, question, answer in cursor:
+                yield position, KBEntry(question, answer)
+        finally:
+            conn.close()
+
+    def entry_at(self, position: int) -> Optional[KBEntry]:
+        """Return the entry at the given file position, if any."""
+        row = self._reader().execute(
+            "SELECT question, answer FROM entries WHERE position = ?", (position,)
+        ).fetchone()
+        return KBEntry(*row) if row else None
+
+    def page(self, start: int, limit: int) -> List[Tuple[int, KBEntry]]:
+        """Return up to `limit` (position, entry) pairs from `start` onwards."""
+        rows = self._reader().execute(
+            "SELECT position, question, answer FROM entries WHERE position >= ? ORDER BY position LIMIT ?",
+            (start, limit),
+        ).fetchall()
+        return [(position, KBEntry(question, answer)) for position, question, answer in rows]
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[int, KBEntry, float]]:
+        """Return the top-k entries for a query, ranked by FTS5 BM25.
+
+        Args:
+            query: Free-text search query.
+            k: Maximum number of results.
+
+        Returns:
+            (position, entry, score) tuples sorted by descending score.
+        """
+        terms = set(tokenize(query))
+        if not terms or k <= 0:
+            return []
+        match = " OR ".join(f'"{term}"' for term in sorted(terms))
+        rows = self._reader().execute(
+            "SELECT e.position, e.question, e.answer, bm25(entries_fts) AS rank "
+            "FROM entries_fts JOIN entries e ON e.id = entries_fts.rowid "
+            "WHERE entries_fts MATCH ? ORDER BY rank LIMIT ?",
+            (match, k),
+        ).fetchall()
+        # FTS5 reports BM25 as a negative number where lower is better
+        return [(position, KBEntry(question, answer), -rank) for position, question, answer, rank in rows]
+
+
+class KnowledgeBase:
+    """Knowledge base loaded from a JSON or JSON Lines file.
+
+    By default the entries are kept in memory in a `KBIndex`. Readers take a
+    reference to `index` once per call; reloads build a new `KBIndex` off to
+    the side and replace the reference in one assignment.
+
+    When `index_path` is given the entries are streamed into a
+    `SqliteKBIndex` at that path instead. An index that was already built
+    from the current version of the file is reused as is, so restarts on a
+    large knowledge base do not re-read it.
+    """
+
+    def __init__(self, path: str, index_path: Optional[str] = None, poll_interval: float = 2.0):
+        self.path = path
+        self.index_path = index_path
+        self.poll_interval = poll_interval
+        self.index: Any = KBIndex([])
+        self.error: Optional[str] = None
+        # Called with the new index after every successful load
+        self.listeners: List[Callable[[Any], None]] = []
+        self.metrics: Dict[str, Any] = {
+            "entries": 0,
+            "reloads": 0,
+            "reload_failures": 0,
+            "last_reload_seconds": None,
+            "last_reload_at": None,
+            "last_added": 0,
+            "last_changed": 0,
+            "last_removed": 0,
+            "last_unchanged": 0,
+            "last_error": None,
+        }
+        self._signature: Optional[Tuple[int, int]] = None
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+    def _file_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self) -> None:
+        """Read the JSON file and build the search index.
+
+        Failures are recorded rather than raised. If no index has been loaded
+        yet, `error` is set so tools can report it; otherwise the previous
+        index keeps serving and the failure only shows up in `metrics`.
+        """
+        with self._reload_lock:
+            started = time.perf_counter()
+            signature = self._file_signature()
+            try:
+                if self.index_path:
+                    counts = self._load_sqlite(signature)
+                else:
+                    counts = self._load_memory()
+            except FileNotFoundError:
+                self._record_failure("Error: Knowledge base file not found", signature)
+                return
+            except json.JSONDecodeError:
+                self._record_failure("Error: Invalid JSON in knowledge base file", signature)
+                return
+            except Exception as e:
+                self._record_failure(f"Error: {str(e)}", signature)
+                return
+
+            self.error = None
+            self._signature = signature
+            self.metrics.update(
+                {
+                    "entries": len(self.index),
+                    "reloads": self.metrics["reloads"] + 1,
+                    "last_reload_seconds": round(time.perf_counter() - started, 6),
+                    "last_reload_at": time.time(),
+                    "last_added": counts["added"],
+                    "last_changed": counts["changed"],
+                    "last_removed": counts["removed"],
+                    "last_unchanged": counts["unchanged"],
+                    "last_error": None,
+                }
+            )
+            for listener in self.listeners:
+                listener(self.index)
+
+    def _load_memory(self) -> Dict[str, int]:
+        previous = self.index if isinstance(self.index, KBIndex) else KBIndex([])
+        try:
+            entries = [entry_from_item(i, item) for i, item in enumerate(iter_json_items(self.path), 1)]
+            raw_data = None
+        except NotJSONArrayError:
+            with open(self.path, "r") as f:
+                raw_data = json.load(f)
+            entries = []
+        index = KBIndex(entries, raw_data=raw_data, previous=previous)
+
+        old_questions = previous.doc_ids_by_question()
+        new_questions = index.doc_ids_by_question()
+        added = sum(1 for q in new_questions if q not in old_questions)
+        removed = sum(1 for q in old_questions if q not in new_questions)
+
+        # Swap in the new index in a single assignment
+        self.index = index
+        return {
+            "added": added,
+            "changed": len(new_questions) - added - index.reused,
+            "removed": removed,
+            "unchanged": index.reused,
+        }
+
+    def _load_sqlite(self, signature: Optional[Tuple[int, int]]) -> Dict[str, int]:
+        if signature is None:
+            raise FileNotFoundError(self.path)
+        index = self.index if isinstance(self.index, SqliteKBIndex) else SqliteKBIndex(self.index_path)
+        key = f"{signature[0]}:{signature[1]}"
+        if index.source_signature() == key:
+            counts = {"added": 0, "changed": 0, "removed": 0, "unchanged": len(index)}
+        else:
+            entries = (entry_from_item(i, item) for i, item in enumerate(iter_json_items(self.path), 1))
+            counts = index.ingest(entries, key)
+        self.index = index
+        return counts
+
+    def _record_failure(self, message: str, signature: Optional[Tuple[int, int]]) -> None:
+        self._signature = signature
+        self.metrics["reload_failures"] += 1
+        self.metrics["last_error"] = message
+        if self.metrics["reloads"] == 0:
+            self.error = message
+
+    def reload_if_changed(self) -> bool:
+        """Reload the file if its mtime or size changed since the last load.
+
+        Returns:
+            True if a reload was attempted.
+        """
+        if self._file_signature() == self._signature:
+            return False
+        self.load()
+        return True
+
+    def start_watching(self) -> None:
+        """Poll the file in a daemon thread and reload it when it changes."""
+        if self._watcher is not None:
+            return
+
+        def watch():
+            while not self._stop.wait(self.poll_interval):
+                try:
+                    self.reload_if_changed()
+                except Exception as e:
+                    self.metrics["last_error"] = f"Error: {str(e)}"
+
+        self._watcher = threading.Thread(target=watch, name="kb-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self) -> None:
+        """Stop the background watcher."""
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+        self._stop.clear()
+
+    def format_all(self) -> str:
+        """Format the entire knowledge base as a string."""
+        index = self.index
+        header = "Here is the retrieved knowledge base:\n\n"
+        if index.raw_data is not None:
+            return header + f"Knowledge base content: {json.dumps(index.raw_data, indent=2)}\n\n"
+        return format_entries(((doc_id + 1, entry) for doc_id, entry in index.iter_entries()), header)
+
+    def list_page(self, cursor: str = "", limit: int = 20) -> str:
+        """Format one page of Q&A pairs followed by the cursor for the next page.
+
+        Args:
+            cursor: Cursor returned by the previous page, or empty for the first.
+            limit: Maximum number of Q&A pairs on the page (1 to MAX_PAGE_SIZE).
+
+        Raises:
+            ValueError: If the cursor is invalid.
+        """
+        index = self.index
+        if index.raw_data is not None:
+            return self.format_all()
+
+        start = decode_cursor(cursor) if cursor else 0
+        limit = min(max(limit, 1), MAX_PAGE_SIZE)
+        rows = index.page(start, limit + 1)
+        page, more = rows[:limit], len(rows) > limit
+
+        header = f"Knowledge base entries {len(page)} of {len(index)}:\n\n"
+        text = format_entries(((doc_id + 1, entry) for doc_id, entry in page), header)
+        if more:
+            return text + f"next_cursor: {encode_cursor(page[-1][0] + 1)}\n"
+        return text + "next_cursor: none (end of knowledge base)\n"
+
+    def search(self, query: str, k: int = 5) -> str:
+        """Search the knowledge base and format the top-k matches (k is capped at MAX_PAGE_SIZE)."""
+        results = self.index.search(query, min(k, MAX_PAGE_SIZE))
+        if not results:
+            return f"No knowledge base entries matched: {query}"
+        header = f"Top {len(results)} knowledge base matches for: {query}\n\n"
+        return format_entries([(doc_id + 1, entry) for doc_id, entry, _ in results], header)
@@ -0,0 +1,318 @@
+"""
+Embedding-based semantic search for the Knowledge Base MCP server.
+
+Each Q&A pair is embedded once with a local sentence-transformers model on
+CPU. The embeddings are stored as a normalized float32 matrix in a `.npy`
+file and memory-mapped at search time, so a query costs one model call plus
+a vectorized dot product over the matrix.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from array import array
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from knowledge_base import KBEntry
+
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+HASH_SIZE = 20
+# Times a refresh restarts when the index changes while it is embedding
+REFRESH_ATTEMPTS = 3
+
+
+class _IndexChanged(Exception):
+    """The knowledge base index changed between the passes of a refresh."""
+
+
+def entry_text(entry: KBEntry) -> str:
+    """Return the text that is embedded for an entry."""
+    return f"{entry.question}\n{entry.answer}"
+
+
+def entry_hash(entry: KBEntry) -> bytes:
+    """Return a stable digest of an entry's text, used to reuse embeddings."""
+    return hashlib.sha1(entry_text(entry).encode("utf-8")).digest()
+
+
+class SemanticIndex:
+    """Memory-mapped embedding matrix over the knowledge base entries.
+
+    Files written to `cache_dir`:
+
+    - `embeddings.npy`: (n, dim) float32 matrix of normalized embeddings
+    - `positions.npy`: knowledge base position of each row
+    - `hashes.npy`: (n, 20) uint8 SHA-1 digest of each row's text
+    - `meta.json`: model name and row count
+
+    A refresh only embeds entries whose text is not already in the matrix,
+    writes new files next to the old ones, and swaps them in with a single
+    assignment so searches never see a half-written matrix.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        model_name: str = DEFAULT_MODEL,
+        batch_size: int = 64,
+        block_rows: int = 65536,
+    ):
+        self.cache_dir = cache_dir
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.block_rows = block_rows
+        self.error: Optional[str] = None
+        self._model: Any = None
+        self._data: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        self._refresh_lock = threading.Lock()
+        # Guards _pending and _worker, so a request can't slip in while the worker exits
+        self._schedule_lock = threading.Lock()
+        self._pending: Any = None
+        self._worker: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._data is not None
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.cache_dir, name)
+
+    def _get_model(self) -> Any:
+        if self._model is None:
+            # Imported lazily: loading torch is slow and only needed here
+            from sentence_transformers import SentenceTransformer
+
+            self._model = SentenceTransformer(self.model_name, device="cpu")
+        return self._model
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embed texts as normalized float32 vectors."""
+        vectors = self._get_model().encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        )
+        return np.asarray(vectors, dtype=np.float32)
+
+    def _load_files(self) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        try:
+            with open(self._path("meta.json"), "r") as f:
+                meta = json.load(f)
+            if meta.get("model") != self.model_name:
+                return None
+            matrix = np.load(self._path("embeddings.npy"), mmap_mode="r")
+            positions = np.load(self._path("positions.npy"))
+            hashes = np.load(self._path("hashes.npy"))
+        except (OSError, ValueError):
+            return None
+        if not (len(matrix) == len(positions) == len(hashes) == meta.get("count")):
+            return None
+        if hashes.ndim != 2 or hashes.shape[1] != HASH_SIZE:
+            return None
+        return matrix, positions, hashes
+
+    def refresh(self, index: Any) -> None:
+        """Bring the embeddings in line with a knowledge base index.
+
+        Args:
+            index: A `KBIndex` or `SqliteKBIndex` to embed.
+        """
+        with self._refresh_lock:
+            for _ in range(REFRESH_ATTEMPTS):
+                try:
+                    self._refresh(index)
+                    return
+                except _IndexChanged:
+                    # A reload committed mid-refresh; start over from the new state
+                    continue
+            # Still changing: the reload that changed it schedules another refresh
+
+    def _refresh(self, index: Any) -> None:
+        old = self._data or self._load_files()
+
+        # First pass: digests and positions only, no model calls
+        position_buf = array("q")
+        hash_buf = bytearray()
+        for position, entry in index.iter_entries():
+            position_buf.append(position)
+            hash_buf += entry_hash(entry)
+        positions = np.array(position_buf, dtype=np.int64)
+        hashes = np.frombuffer(bytes(hash_buf), dtype=np.uint8).reshape(-1, HASH_SIZE)
+
+        if len(hashes) == 0:
+            self._data = (np.zeros((0, 0), dtype=np.float32), positions, hashes)
+            return
+        if old is not None and np.array_equal(old[2], hashes):
+            self._data = (old[0], positions, hashes)
+            self._write_positions(positions)
+            return
+
+        self._data = self._build(index, positions, hashes, old)
+
+    def _build(
+        self,
+        index: Any,
+        positions: np.ndarray,
+        hashes: np.ndarray,
+        old: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]],
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        old_rows = {h.tobytes(): row for row, h in enumerate(old[2])} if old is not None else {}
+        dim = old[0].shape[1] if old is not None else self._get_model().get_sentence_embedding_dimension()
+
+        tmp_path = self._path("embeddings.tmp.npy")
+        matrix = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(len(hashes), dim))
+
+        pending_rows: List[int] = []
+        pending_texts: List[str] = []
+
+        def flush() -> None:
+            if pending_texts:
+                matrix[pending_rows] = self.encode(pending_texts)
+                pending_rows.clear()
+                pending_texts.clear()
+
+        # Second pass: SqliteKBIndex is updated in place, so every row is
+        # checked against the first pass; a row must never pair one entry's
+        # hash with another entry's vector
+        rows = 0
+        try:
+            for row, (position, entry) in enumerate(index.iter_entries()):
+                digest = entry_hash(entry)
+                if row >= len(hashes) or position != positions[row] or digest != hashes[row].tobytes():
+                    raise _IndexChanged()
+                rows += 1
+                old_row = old_rows.get(digest)
+                if old_row is not None:
+                    matrix[row] = old[0][old_row]
+                else:
+                    pending_rows.append(row)
+                    pending_texts.append(entry_text(entry))
+                    if len(pending_texts) >= self.batch_size:
+                        flush()
+            if rows != len(hashes):
+                raise _IndexChanged()
+            flush()
+            matrix.flush()
+        except BaseException:
+            del matrix
+            os.remove(tmp_path)
+            raise
+        del matrix
+
+        os.replace(tmp_path, self._path("embeddings.npy"))
+        np.save(self._path("hashes.npy"), hashes)
+        self._write_positions(positions)
+        with open(self._path("meta.json"), "w") as f:
+            json.dump({"model": self.model_name, "count": int(len(hashes))}, f)
+
+        return np.load(self._path("embeddings.npy"), mmap_mode="r"), positions, hashes
+
+    def _write_positions(self, positions: np.ndarray) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        np.save(self._path("positions.npy"), positions)
+
+    def schedule_refresh(self, index: Any) -> None:
+        """Refresh in a background thread, coalescing overlapping requests."""
+        with self._schedule_lock:
+            self._pending = index
+            if self._worker is not None:
+                # The running worker picks it up before it exits
+                return
+            self._worker = threading.Thread(target=self._work, name="kb-semantic-index", daemon=True)
+            self._worker.start()
+
+    def _work(self) -> None:
+        while True:
+            with self._schedule_lock:
+                target, self._pending = self._pending, None
+                if target is None:
+                    self._worker = None
+                    return
+            try:
+                self.refresh(target)
+                self.error = None
+            except Exception as e:
+                self.error = f"Error: {str(e)}"
+
+    def _top_rows(self, data: Tuple[np.ndarray, np.ndarray, np.ndarray], query: str, k: int) -> List[Tuple[int, float]]:
+        matrix = data[0]
+        vector = self.encode([query])[0]
+
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start in range(0, len(matrix), self.block_rows):
+            scores = np.asarray(matrix[start : start + self.block_rows]) @ vector
+            top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+            best_rows = np.concatenate([best_rows, top + start])
+            best_scores = np.concatenate([best_scores, scores[top]])
+            if len(best_scores) > k:
+                keep = np.argpartition(-best_scores, k - 1)[:k]
+                best_rows, best_scores = best_rows[keep], best_scores[keep]
+
+        order = np.argsort(-best_scores)
+        return [(int(best_rows[i]), float(best_scores[i])) for i in order]
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[int, float]]:
+        """Return the top-k knowledge base positions for a query.
+
+        Similarity is computed block by block over the memory-mapped matrix,
+        so only `block_rows` rows are paged in at a time. The positions are
+        those of the last refresh; use `search_entries` to resolve them
+        against a live index.
+
+        Args:
+            query: Free-text search query.
+            k: Maximum number of results.
+
+        Returns:
+            (position, cosine similarity) pairs sorted by descending similarity.
+        """
+        data = self._data
+        if data is None or k <= 0 or len(data[0]) == 0:
+            return []
+        positions = data[1]
+        return [(int(positions[row]), score) for row, score in self._top_rows(data, query, k)]
+
+    def search_entries(self, index: Any, query: str, k: int = 5) -> List[Tuple[int, KBEntry, float]]:
+        """Return the top-k entries of a knowledge base index for a query.
+
+        After a reload the matrix lags behind the index until the background
+        refresh finishes. Each row is checked against the entry now at its
+        position and dropped if the text differs, so a stale matrix never
+        returns one entry with another entry's score.
+
+        Args:
+            index: The `KBIndex` or `SqliteKBIndex` to resolve positions in.
+            query: Free-text search query.
+            k: Maximum number of results.
+
+        Returns:
+            (position, entry, cosine similarity) tuples sorted by descending similarity.
+        """
+        data = self._data
+        if data is None or k <= 0 or len(data[0]) == 0:
+            return []
+        _, positions, hashes = data
+        matches = []
+        for row, score in self._top_rows(data, query, k):
+            position = int(positions[row])
+            entry = index.entry_at(position)
+            if entry is not None and entry_hash(entry) == hashes[row].tobytes():
+                matches.append((position, entry, score))
+        return matches
+
+
+def format_matches(matches: Iterable[Tuple[int, KBEntry, float]], query: str) -> str:
+    """Format semantic matches as a numbered Q&A block."""
+    parts = [f"Semantic matches for: {query}\n\n"]
+    for position, entry, score in matches:
+        parts.append(
+            f"Q{position + 1}: {entry.question}\nA{position + 1}: {entry.answer}\n(similarity: {score:.3f})\n\n"
+        )
+    return "".join(parts)
@@ -1,7 +1,10 @@
-import os
 import json
+import os
 from mcp.server.fastmcp import FastMCP
 
+from knowledge_base import MAX_PAGE_SIZE, KnowledgeBase
+from semantic_index import DEFAULT_MODEL, SemanticIndex, format_matches
+
 # Create an MCP server
 mcp = FastMCP(
     name="Knowledge Base",
@@ -10,6 +13,27 @@ mcp = FastMCP(
 )
 
 
+# Load the knowledge base once at startup.
+# KB_PATH may point to a JSON array or JSON Lines file. Set KB_INDEX_PATH to
+# stream it into an on-disk SQLite index instead of keeping it in memory.
+# Edits to the file are picked up by a background watcher without a restart.
+kb = KnowledgeBase(
+    os.getenv("KB_PATH", os.path.join(os.path.dirname(__file__), "data", "kb.json")),
+    index_path=os.getenv("KB_INDEX_PATH"),
+)
+
+# Embeddings are (re)built in a background thread after every load and
+# persisted as memory-mapped .npy files, so restarts reuse them.
+semantic = SemanticIndex(
+    os.getenv("KB_EMBEDDINGS_DIR", os.path.join(os.path.dirname(__file__), "data", "embeddings")),
+    model_name=os.getenv("KB_EMBEDDING_MODEL", DEFAULT_MODEL),
+)
+kb.listeners.append(semantic.schedule_refresh)
+
+kb.load()
+kb.start_watching()
+
+
 @mcp.tool()
 def get_knowledge_base() -> str:
     """Retrieve the entire knowledge base as a formatted string.
@@ -17,37 +41,91 @@ def get_knowledge_base() -> str:
     Returns:
         A formatted string containing all Q&A pairs from the knowledge base.
     """
+    if kb.error:
+        return kb.error
+    try:
+        return kb.format_all()
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+@mcp.tool()
+def search_knowledge_base(query: str, k: int = 5) -> str:
+    """Search the knowledge base and return only the most relevant Q&A pairs.
+
+    Args:
+        query: Free-text search query, e.g. the user's question.
+        k: Maximum number of Q&A pairs to return (at most 100).
+
+    Returns:
+        A formatted string containing the top-k matching Q&A pairs.
+    """
+    if kb.error:
+        return kb.error
     try:
-        kb_path = os.path.join(os.path.dirname(__file__), "data", "kb.json")
-        with open(kb_path, "r") as f:
-            kb_data = json.load(f)
-
-        # Format the knowledge base as a string
-        kb_text = "Here is the retrieved knowledge base:\n\n"
-
-        if isinstance(kb_data, list):
-            for i, item in enumerate(kb_data, 1):
-                if isinstance(item, dict):
-                    question = item.get("question", "Unknown question")
-                    answer = item.get("answer", "Unknown answer")
-                else:
-                    question = f"Item {i}"
-                    answer = str(item)
-
-                kb_text += f"Q{i}: {question}\n"
-                kb_text += f"A{i}: {answer}\n\n"
-        else:
-            kb_text += f"Knowledge base content: {json.dumps(kb_data, indent=2)}\n\n"
-
-        return kb_text
-    except FileNotFoundError:
-        return "Error: Knowledge base file not found"
-    except json.JSONDecodeError:
-        return "Error: Invalid JSON in knowledge base file"
+        return kb.search(query, k)
     except Exception as e:
         return f"Error: {str(e)}"
 
 
+@mcp.tool()
+def semantic_search(query: str, k: int = 5) -> str:
+    """Find the Q&A pairs whose meaning is closest to the query.
+
+    Unlike `search_knowledge_base`, this matches paraphrases and related
+    wording, not just shared keywords.
+
+    Args:
+        query: Free-text search query, e.g. the user's question.
+        k: Maximum number of Q&A pairs to return (at most 100).
+
+    Returns:
+        A formatted string containing the top-k Q&A pairs and their similarity.
+    """
+    if kb.error:
+        return kb.error
+    if semantic.error:
+        return semantic.error
+    if not semantic.ready:
+        return "Error: Semantic index is still being built, use search_knowledge_base for now"
+    try:
+        matches = semantic.search_entries(kb.index, query, min(k, MAX_PAGE_SIZE))
+        if not matches:
+            return f"No knowledge base entries matched: {query}"
+        return format_matches(matches, query)
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+@mcp.tool()
+def list_knowledge_base(cursor: str = "", limit: int = 20) -> str:
+    """Retrieve one page of the knowledge base.
+
+    Use this instead of `get_knowledge_base` to read a large knowledge base
+    piece by piece. Pass the `next_cursor` value from the previous page to
+    continue where it left off.
+
+    Args:
+        cursor: Cursor from the previous page, or empty for the first page.
+        limit: Maximum number of Q&A pairs to return (at most 100).
+
+    Returns:
+        A formatted page of Q&A pairs followed by a `next_cursor` line.
+    """
+    if kb.error:
+        return kb.error
+    try:
+        return kb.list_page(cursor, limit)
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+@mcp.resource("kb://metrics")
+def knowledge_base_metrics() -> str:
+    """Knowledge base reload timings and entry counts as JSON."""
+    return json.dumps(kb.metrics, indent=2)
+
+
 # Run the server
 if __name__ == "__main__":
     mcp.run(transport="stdio")
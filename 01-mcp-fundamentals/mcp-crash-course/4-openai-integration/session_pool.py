@@ -0,0 +1,230 @@
+"""
+A pool of MCP client sessions for high-concurrency clients.
+
+A single `ClientSession` over one stdio pipe handles one request stream, so
+concurrent queries queue up behind each other. `MCPSessionPool` opens several
+sessions (one server process or HTTP session each), hands out the least busy
+one, and replaces sessions that die or stop answering pings.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncContextManager, AsyncIterator, Callable, List, Optional
+
+from mcp import ClientSession
+
+# Returns a transport context manager yielding (read_stream, write_stream, ...)
+TransportFactory = Callable[[], AsyncContextManager[Any]]
+
+
+class PooledSession:
+    """One MCP session kept open by its own background task.
+
+    The transport and session context managers are entered and exited in
+    the same task, which anyio requires, so the session can be closed from
+    any other task.
+    """
+
+    def __init__(self, connect: TransportFactory, message_handler: Optional[Callable] = None):
+        self.connect = connect
+        self.message_handler = message_handler
+        self.session: Optional[ClientSession] = None
+        self.in_flight = 0
+        self.error: Optional[BaseException] = None
+        self._ready = asyncio.Event()
+        self._closed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def alive(self) -> bool:
+        return self.session is not None and self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        """Open and initialize the session.
+
+        Raises:
+            Exception: Whatever prevented the session from starting.
+        """
+        self._task = asyncio.create_task(self._run())
+        try:
+            await self._ready.wait()
+        except asyncio.CancelledError:
+            # Don't leave a half-started server behind, e.g. under a timeout
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            raise
+        if self.error is not None:
+            raise self.error
+
+    async def _run(self) -> None:
+        try:
+            async with self.connect() as streams:
+                read, write = streams[0], streams[1]
+                async with ClientSession(read, write, message_handler=self.message_handler) as session:
+                    await session.initialize()
+                    self.session = session
+                    self._ready.set()
+                    await self._closed.wait()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.session = None
+            self._ready.set()
+
+    async def ping(self, timeout: float) -> bool:
+        """Return True if the session answers a ping within `timeout` seconds."""
+        if not self.alive:
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout=timeout)
+            return True
+        except Exception:
+            return False
+
+    async def close(self) -> None:
+        """Close the session and wait for its task to finish."""
+        self._closed.set()
+        if self._task is not None:
+            try:
+                await self._task
+            except Exception:
+                pass
+
+
+class MCPSessionPool:
+    """Fixed-size pool of MCP sessions with least-busy dispatch.
+
+    Usage:
+        pool = MCPSessionPool(lambda: stdio_client(server_params), size=4)
+        await pool.start()
+        async with pool.acquire() as session:
+            await session.call_tool("add", {"a": 1, "b": 2})
+        await pool.close()
+    """
+
+    def __init__(
+        self,
+        connect: TransportFactory,
+        size: int = 4,
+        message_handler: Optional[Callable] = None,
+        health_check_interval: Optional[float] = 30.0,
+        ping_timeout: float = 5.0,
+    ):
+        """Initialize the pool.
+
+        Args:
+            connect: Factory returning a new transport context manager,
+                e.g. `lambda: stdio_client(params)`.
+            size: Number of sessions to keep open.
+            message_handler: Passed to every `ClientSession`.
+            health_check_interval: Seconds between background health checks,
+                or None to only check on demand.
+            ping_timeout: Seconds a session has to answer a health-check ping.
+        """
+        self.connect = connect
+        self.size = size
+        self.message_handler = message_handler
+        self.health_check_interval = health_check_interval
+        self.ping_timeout = ping_timeout
+        self.sessions: List[PooledSession] = []
+        self.replacements = 0
+        self._replace_lock = asyncio.Lock()
+        self._health_task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "MCPSessionPool":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def _open(self) -> PooledSession:
+        pooled = PooledSession(self.connect, self.message_handler)
+        await pooled.start()
+        return pooled
+
+    async def start(self) -> None:
+        """Open all sessions concurrently and start health checks.
+
+        If any session fails to open, the ones that did open are closed
+        before the error is raised.
+        """
+        opened = await asyncio.gather(*(self._open() for _ in range(self.size)), return_exceptions=True)
+        errors = [result for result in opened if isinstance(result, BaseException)]
+        if errors:
+            await asyncio.gather(*(result.close() for result in opened if isinstance(result, PooledSession)))
+            raise errors[0]
+        self.sessions = list(opened)
+        if self.health_check_interval is not None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            try:
+                await self.health_check()
+            except Exception as e:
+                print(f"Session pool health check failed: {e}")
+
+    async def health_check(self) -> int:
+        """Ping every idle session and replace the ones that do not answer.
+
+        Busy sessions are skipped; a session that is answering requests is
+        healthy enough, and pings would queue behind its work anyway.
+
+        Returns:
+            The number of sessions replaced.
+        """
+        replaced = 0
+        for i, pooled in enumerate(list(self.sessions)):
+            if pooled.in_flight == 0 and not await pooled.ping(self.ping_timeout):
+                await self._replace(i, pooled)
+                replaced += 1
+            elif not pooled.alive:
+                await self._replace(i, pooled)
+                replaced += 1
+        return replaced
+
+    async def _replace(self, i: int, dead: PooledSession) -> PooledSession:
+        async with self._replace_lock:
+            # Another task may have replaced it already
+            if self.sessions[i] is not dead:
+                return self.sessions[i]
+            await dead.close()
+            fresh = await self._open()
+            self.sessions[i] = fresh
+            self.replacements += 1
+            return fresh
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[ClientSession]:
+        """Borrow the live session with the fewest requests in flight.
+
+        A dead session found here is replaced before it is handed out.
+        """
+        live = [p for p in self.sessions if p.alive]
+        if live:
+            pooled = min(live, key=lambda p: p.in_flight)
+        else:
+            pooled = await self._replace(0, self.sessions[0])
+
+        pooled.in_flight += 1
+        try:
+            yield pooled.session
+        finally:
+            pooled.in_flight -= 1
+
+    async def close(self) -> None:
+        """Stop health checks and close every session."""
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        await asyncio.gather(*(pooled.close() for pooled in self.sessions))
+        self.sessions = []
@@ -1,5 +1,7 @@
 # from langgraph_supervisor import create_supervisor
+import argparse
 import asyncio
+import time
 from langchain_openai import ChatOpenAI
 
 # Import the agent
@@ -19,6 +21,9 @@ load_dotenv(dotenv_path=env_path)
 # MCP
 from langchain_mcp_adapters.client import MultiServerMCPClient
 
+# Client-side tool call caching
+from mcp_tools import CachePolicy, PersistentSessions, get_cached_tools
+
 
 # MCP connection setup
 client = MultiServerMCPClient(
@@ -65,29 +70,117 @@ client = MultiServerMCPClient(
     }
 )
 
+# Cache policies per server. All three demo tools are idempotent, so
+# identical calls within the TTL are answered without a round trip.
+TOOL_CACHE = {
+    "math": CachePolicy(ttl=None),
+    "weather": CachePolicy(ttl=600),
+    "temperature": CachePolicy(ttl=300),
+}
+
 # Create the agent
 DEPLOYMENT_NAME = os.getenv("deployment_name")
 model = ChatOpenAI(model = DEPLOYMENT_NAME, temperature=0.0)
 
 
+# Default prompts: one per server/transport
+PROMPTS = [
+    "What is 102+298",
+    "What is the weather in Tokyo",
+    "What is the temperature in Tokyo",
+]
+
+
+async def run_queries(agent, prompts, max_concurrency = 4):
+    """Run independent prompts through the agent concurrently.
+
+    Args:
+        agent: The compiled agent graph.
+        prompts: User prompts; each one is a separate conversation.
+        max_concurrency: Maximum number of `agent.ainvoke` calls in flight.
+
+    Returns:
+        One (prompt, answer, latency in seconds) tuple per prompt, in input
+        order. A failed query has "Error: ..." as its answer.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run_one(prompt):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await agent.ainvoke({"messages": [{"role": "user", "content": prompt}]})
+                answer = response["messages"][-1].content
+            except Exception as e:
+                answer = f"Error: {str(e)}"
+            return prompt, answer, time.perf_counter() - start
+
+    return await asyncio.gather(*(run_one(prompt) for prompt in prompts))
+
+
+def latency_report(results, wall_time):
+    """Summarize per-query latencies (count, throughput, p50/p95/max)."""
+    latencies = sorted(latency for _, _, latency in results)
+    if not latencies:
+        return "No queries run"
+    errors = sum(1 for _, answer, _ in results if str(answer).startswith("Error:"))
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+    return (
+        f"{len(latencies)} queries ({errors} errors) in {wall_time:.2f}s "
+        f"({len(latencies) / wall_time:.2f} queries/s) | "
+        f"p50 {percentile(0.5):.2f}s, p95 {percentile(0.95):.2f}s, max {latencies[-1]:.2f}s"
+    )
+
+
 # Run the agent
-async def run_agent(client = client):
+async def run_agent(client = client, prompts = PROMPTS, max_concurrency = 4, repeat = 1, use_cache = None):
+    """Run prompts concurrently and print per-query latency.
+
+    With `repeat` > 1 every prompt is sent several times, which turns this
+    into a small load generator for the three transports.
+
+    Args:
+        use_cache: Route tool calls through the client-side result cache.
+            Defaults to on for a single pass and off when `repeat` > 1, so
+            repeated calls actually reach the servers.
+    """
+    if use_cache is None:
+        use_cache = repeat <= 1
     # Keep sessions alive during agent execution
-    all_tools = await client.get_tools()
-    print(all_tools)
+    async with PersistentSessions(client) as sessions:
+        all_tools = await get_cached_tools(sessions, TOOL_CACHE) if use_cache else await sessions.get_tools()
+        print(all_tools)
+            
+        agent = create_react_agent(
+            model=model,
+            tools=all_tools,
+            prompt="Use the tools available to you to answer the question",
+            debug=False,
+        )
         
-    agent = create_react_agent(
-        model=model,
-        tools=all_tools,
-        prompt="Use the tools available to you to answer the question",
-        debug=False,
-    )
-    
-    math_response = await agent.ainvoke({"messages":[{"role": "user", "content": "What is 102+298"}]})
-    weather_response = await agent.ainvoke({"messages":[{"role": "user", "content": "What is the weather in Tokyo"}]})
-    temperature_response = await agent.ainvoke({"messages": [{"role": "user", "content": "What is the temperature in Tokyo"}]})
-    return math_response["messages"][-1].content, weather_response["messages"][-1].content, temperature_response["messages"][-1].content
+        start = time.perf_counter()
+        results = await run_queries(agent, list(prompts) * repeat, max_concurrency)
+        wall_time = time.perf_counter() - start
+
+    for prompt, answer, latency in results:
+        print(f"[{latency:.2f}s] {prompt} -> {answer}")
+    print(latency_report(results, wall_time))
+    return [answer for _, answer, _ in results]
 
 if __name__ == "__main__":
-    print(asyncio.run((run_agent())))
-    # print("Hi")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run prompts against the multi-server agent")
+    parser.add_argument("prompts", nargs="*", help="Prompts to run (defaults to one per server)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum queries in flight")
+    parser.add_argument("--repeat", type=int, default=1, help="Send every prompt this many times (load test)")
+    cache = parser.add_mutually_exclusive_group()
+    cache.add_argument("--cache", dest="use_cache", action="store_true", default=None,
+                       help="Use the client-side tool result cache (default unless --repeat > 1)")
+    cache.add_argument("--no-cache", dest="use_cache", action="store_false",
+                       help="Call the servers on every tool call (default when --repeat > 1)")
+    args = parser.parse_args()
+    asyncio.run(run_agent(prompts=args.prompts or PROMPTS, max_concurrency=args.concurrency,
+                          repeat=args.repeat, use_cache=args.use_cache))
+    # print("Hi")
@@ -1,6 +1,8 @@
 from mcp.server.fastmcp import FastMCP
 from dotenv import load_dotenv
 
+from tool_cache import cached_tool, register_metrics_resource
+
 load_dotenv("../.env")
 
 # Create an MCP server
@@ -12,14 +14,18 @@ mcp = FastMCP(
 )
 
 
-# Add a simple calculator tool
-@mcp.tool()
+# Add a simple temperature tool, cached for 5 minutes per city
+@cached_tool(mcp, ttl=300, max_entries=512)
 def temperature(city: str) -> str:
     """Get the temperature for a city"""
     
     return f"The temperature in {city} is 20 degrees"
 
 
+# Expose cache hit/miss/eviction counts as a resource
+register_metrics_resource(mcp)
+
+
 # Run the server
 if __name__ == "__main__":
     transport = "streamable-http"
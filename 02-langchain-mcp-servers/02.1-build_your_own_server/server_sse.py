@@ -1,6 +1,8 @@
 from mcp.server.fastmcp import FastMCP
 from dotenv import load_dotenv
 
+from tool_cache import cached_tool, register_metrics_resource
+
 load_dotenv("../.env")
 
 # Create an MCP server
@@ -12,14 +14,18 @@ mcp = FastMCP(
 )
 
 
-# Add a simple calculator tool
-@mcp.tool()
+# Add a simple weather tool, cached for 10 minutes per city
+@cached_tool(mcp, ttl=600, max_entries=512)
 def weather(city: str) -> str:
     """Get the weather for a city"""
     
     return f"The weather in {city} is sunny"
 
 
+# Expose cache hit/miss/eviction counts as a resource
+register_metrics_resource(mcp)
+
+
 # Run the server
 if __name__ == "__main__":
     transport = "sse"
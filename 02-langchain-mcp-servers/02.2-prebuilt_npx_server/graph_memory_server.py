@@ -22,6 +22,9 @@ from langchain_mcp_adapters.client import MultiServerMCPClient
 # Helper
 from helper import stream_agent_output
 
+# Client-side tool call caching
+from mcp_tools import CachePolicy, PersistentSessions, get_cached_tools
+
 
 # MCP connection setup
 client = MultiServerMCPClient(
@@ -33,6 +36,23 @@ client = MultiServerMCPClient(
     }
 )
 
+# Cache the read-only memory tools. Any write clears the memory server's
+# cached results, so reads never return a stale graph.
+WRITE = CachePolicy(invalidates=True)
+TOOL_CACHE = {
+    "memory": {
+        "read_graph": CachePolicy(ttl=300),
+        "search_nodes": CachePolicy(ttl=300),
+        "open_nodes": CachePolicy(ttl=300),
+        "create_entities": WRITE,
+        "create_relations": WRITE,
+        "add_observations": WRITE,
+        "delete_entities": WRITE,
+        "delete_observations": WRITE,
+        "delete_relations": WRITE,
+    },
+}
+
 # Create the agent
 DEPLOYMENT_NAME = os.getenv("deployment_name")
 model = ChatOpenAI(model = DEPLOYMENT_NAME, temperature=0.0)
@@ -92,32 +112,32 @@ Use the appropriate tools to answer questions accurately and maintain a comprehe
 # Run the agent
 async def run_agent(client = client):
     # Keep sessions alive during agent execution
-    all_tools = await client.get_tools()
-    # Print just the tool names, not the full objects
-    print("Available tools:")
-    for i, tool in enumerate(all_tools, 1):
-        print(f"  {i}. {tool.name}")
-    print()
+    async with PersistentSessions(client) as sessions:
+        all_tools = await get_cached_tools(sessions, TOOL_CACHE)
+        # Print just the tool names, not the full objects
+        print("Available tools:")
+        for i, tool in enumerate(all_tools, 1):
+            print(f"  {i}. {tool.name}")
+        print()
         
-    agent = create_react_agent(
-        model=model,
-        tools=all_tools,
-        prompt=PROMPT,
-        debug=False,
-        )
+        agent = create_react_agent(
+            model=model,
+            tools=all_tools,
+            prompt=PROMPT,
+            debug=False,
+            )
     
-    while True:
-        user_input = input("\nUser: ")
-        if user_input.lower() == 'quit':
-            break
+        while True:
+            user_input = input("\nUser: ")
+            if user_input.lower() == 'quit':
+                break
             
-        input_data = {"messages": [{"role": "user", "content": user_input}]}
+            input_data = {"messages": [{"role": "user", "content": user_input}]}
         
-        print("Agent: ", end="", flush=True)
+            print("Agent: ", end="", flush=True)
         
-        # Stream the response
-        await stream_agent_output(agent, input_data)    
-
+            # Stream the response
+            await stream_agent_output(agent, input_data)
 
 if __name__ == "__main__":
     print(asyncio.run((run_agent())))
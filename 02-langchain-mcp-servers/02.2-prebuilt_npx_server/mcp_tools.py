@@ -0,0 +1,428 @@
+# Helpers for the tools returned by MultiServerMCPClient
+#
+# Copied into 02.1-build_your_own_server, 02.2-prebuilt_npx_server and
+# 03-langchain-third-party-integrations so each example folder can be copied
+# and run on its own, like the rest of the tutorial. Keep the copies identical.
+
+import asyncio
+import json
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from langchain_core.tools import BaseTool, ToolException
+from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_mcp_adapters.prompts import load_mcp_prompt
+from langchain_mcp_adapters.tools import load_mcp_tools
+from mcp import ClientSession
+
+
+@dataclass
+class CachePolicy:
+    """How calls to one tool (or every tool of a server) are cached.
+
+    Attributes:
+        ttl: Seconds a result stays valid, or None to never expire.
+        max_entries: Maximum number of results kept in memory for the tool.
+        invalidates: Don't cache this tool; instead clear every cached result
+            of its server after it succeeds. Use it for tools that write.
+    """
+
+    ttl: Optional[float] = 300.0
+    max_entries: int = 1024
+    invalidates: bool = False
+
+
+# Per-server config: one policy for all tools, or a policy per tool name.
+# Servers and tools that are not listed are never cached.
+CacheConfig = Dict[str, Union[CachePolicy, Dict[str, CachePolicy]]]
+
+
+class ToolCallCache:
+    """Memoizes tool calls across agent turns.
+
+    - An in-memory LRU per tool, with the tool's TTL
+    - An optional SQLite file so results survive restarts, holding at most
+      `max_disk_entries` rows; expired rows are purged on open and on write
+    - Single flight: concurrent identical calls share one in-flight request
+    - Invalidating a server also discards the results of its calls that
+      were still in flight, so a read overlapping a write isn't cached
+    """
+
+    def __init__(self, sqlite_path: Optional[str] = None, max_disk_entries: int = 10000):
+        self._memory: Dict[Tuple[str, str], "OrderedDict[str, Tuple[Any, float]]"] = {}
+        # key -> (server generation the call started under, task)
+        self._in_flight: Dict[str, Tuple[int, "asyncio.Future[Any]"]] = {}
+        # Bumped by invalidate(); results from older generations aren't stored
+        self._generations: Dict[str, int] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS tool_cache ("
+                "key TEXT PRIMARY KEY, server TEXT NOT NULL, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS tool_cache_expires_at ON tool_cache (expires_at)")
+            self._db.execute("DELETE FROM tool_cache WHERE expires_at <= ?", (time.time(),))
+            self._db.commit()
+
+    @staticmethod
+    def make_key(server: str, tool: str, arguments: Dict[str, Any]) -> str:
+        return json.dumps([server, tool, arguments], sort_keys=True, default=repr, separators=(",", ":"))
+
+    def _db_get(self, key: str) -> Optional[Tuple[Any, float]]:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM tool_cache WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+        if row is None:
+            return None
+        # Convert the wall-clock expiry back to the monotonic clock
+        return pickle.loads(row[0]), time.monotonic() + (row[1] - time.time())
+
+    def _db_put(self, key: str, server: str, value: Any, ttl: Optional[float]) -> None:
+        expires_at = time.time() + ttl if ttl is not None else float("inf")
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO tool_cache (key, server, value, expires_at) VALUES (?, ?, ?, ?)",
+                (key, server, pickle.dumps(value), expires_at),
+            )
+            self._db.execute("DELETE FROM tool_cache WHERE expires_at <= ?", (time.time(),))
+            # A replaced row gets a new rowid, so the lowest rowids are the oldest writes
+            self._db.execute(
+                "DELETE FROM tool_cache WHERE rowid <= "
+                "(SELECT rowid FROM tool_cache ORDER BY rowid DESC LIMIT 1 OFFSET ?)",
+                (self.max_disk_entries,),
+            )
+            self._db.commit()
+
+    def _db_delete(self, key: str) -> None:
+        with self._db_lock:
+            self._db.execute("DELETE FROM tool_cache WHERE key = ?", (key,))
+            self._db.commit()
+
+    def _db_clear(self, server: str) -> None:
+        with self._db_lock:
+            self._db.execute("DELETE FROM tool_cache WHERE server = ?", (server,))
+            self._db.commit()
+
+    async def get_or_call(
+        self,
+        server: str,
+        tool: str,
+        arguments: Dict[str, Any],
+        policy: CachePolicy,
+        call: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """Return a cached result for the call, or make the call and cache it."""
+        key = self.make_key(server, tool, arguments)
+        lru = self._memory.setdefault((server, tool), OrderedDict())
+
+        cached = lru.get(key)
+        if cached is not None and cached[1] > time.monotonic():
+            lru.move_to_end(key)
+            self.hits += 1
+            return cached[0]
+
+        generation = self._generations.get(server, 0)
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None and in_flight[0] == generation:
+            self.shared += 1
+            task = in_flight[1]
+        else:
+            # The call runs in its own task, so cancelling one caller (e.g. a
+            # Streamlit rerun) doesn't cancel it for the others sharing it
+            task = asyncio.ensure_future(self._fetch(key, server, generation, lru, policy, call))
+            self._in_flight[key] = (generation, task)
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    async def _fetch(
+        self,
+        key: str,
+        server: str,
+        generation: int,
+        lru: "OrderedDict[str, Tuple[Any, float]]",
+        policy: CachePolicy,
+        call: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        stored = await asyncio.to_thread(self._db_get, key) if self._db is not None else None
+        if stored is not None:
+            self.hits += 1
+            value, expires_at = stored
+        else:
+            self.misses += 1
+            value = await call()
+            expires_at = time.monotonic() + policy.ttl if policy.ttl is not None else float("inf")
+            if self._db is not None and self._generations.get(server, 0) == generation:
+                await asyncio.to_thread(self._db_put, key, server, value, policy.ttl)
+                if self._generations.get(server, 0) != generation:
+                    # Invalidated while writing: don't leave the stale row behind
+                    await asyncio.to_thread(self._db_delete, key)
+
+        # The server was invalidated while this call ran (e.g. a write ran
+        # alongside this read), so the result may already be stale
+        if self._generations.get(server, 0) != generation:
+            return value
+        lru[key] = (value, expires_at)
+        lru.move_to_end(key)
+        while len(lru) > policy.max_entries:
+            lru.popitem(last=False)
+        return value
+
+    def _finish(self, key: str, task: "asyncio.Future[Any]") -> None:
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None and in_flight[1] is task:
+            del self._in_flight[key]
+        # Mark the exception as retrieved in case every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    async def invalidate(self, server: str) -> None:
+        """Drop every cached result of a server, including calls still in flight."""
+        self._generations[server] = self._generations.get(server, 0) + 1
+        for (cached_server, _), lru in self._memory.items():
+            if cached_server == server:
+                lru.clear()
+        # Later identical calls start a fresh request instead of joining a stale one
+        stale = [key for key in self._in_flight if json.loads(key)[0] == server]
+        for key in stale:
+            del self._in_flight[key]
+        if self._db is not None:
+            await asyncio.to_thread(self._db_clear, server)
+
+    def metrics(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "shared_in_flight": self.shared}
+
+
+def _policy_for(config: CacheConfig, server: str, tool: str) -> Optional[CachePolicy]:
+    server_config = config.get(server)
+    if isinstance(server_config, CachePolicy):
+        return server_config
+    if isinstance(server_config, dict):
+        return server_config.get(tool)
+    return None
+
+
+def memoize_tool(tool: BaseTool, server: str, policy: CachePolicy, cache: ToolCallCache) -> BaseTool:
+    """Return a copy of an MCP tool whose calls go through `cache`."""
+    original = tool.coroutine
+
+    if policy.invalidates:
+
+        async def call(**arguments: Any) -> Any:
+            result = await original(**arguments)
+            await cache.invalidate(server)
+            return result
+
+    else:
+
+        async def call(**arguments: Any) -> Any:
+            return await cache.get_or_call(server, tool.name, arguments, policy, lambda: original(**arguments))
+
+    return tool.model_copy(update={"coroutine": call})
+
+
+async def get_cached_tools(
+    client: Union[MultiServerMCPClient, "PersistentSessions"],
+    config: CacheConfig,
+    cache: Optional[ToolCallCache] = None,
+) -> List[BaseTool]:
+    """Load the tools of every server, memoizing the ones listed in `config`.
+
+    Args:
+        client: The multi-server client, or `PersistentSessions` over it.
+        config: Cache policies per server, or per tool within a server.
+        cache: The cache to use; a new in-memory cache by default.
+
+    Returns:
+        All tools, in server order, ready to pass to an agent.
+    """
+    cache = cache or ToolCallCache()
+    tools: List[BaseTool] = []
+    for server in client.connections:
+        for tool in await client.get_tools(server_name=server):
+            policy = _policy_for(config, server, tool.name)
+            tools.append(memoize_tool(tool, server, policy, cache) if policy else tool)
+    return tools
+
+
+class _ServerSession:
+    """One initialized session to one server, kept open by its own task.
+
+    The session context manager is entered and exited in the same task,
+    which anyio requires, so the session can be closed from any other task.
+    """
+
+    def __init__(self, client: MultiServerMCPClient, server: str):
+        self.client = client
+        self.server = server
+        self.session: Optional[ClientSession] = None
+        self.tools: Dict[str, BaseTool] = {}
+        self.error: Optional[BaseException] = None
+        self._ready = asyncio.Event()
+        self._closed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def alive(self) -> bool:
+        return self.session is not None and self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+        try:
+            await self._ready.wait()
+        except asyncio.CancelledError:
+            # The session isn't registered anywhere yet, so nothing else
+            # would ever close it: stop the half-started task here
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            raise
+        if self.error is not None:
+            raise self.error
+
+    async def _run(self) -> None:
+        try:
+            async with self.client.session(self.server) as session:
+                self.tools = {tool.name: tool for tool in await load_mcp_tools(session)}
+                self.session = session
+                self._ready.set()
+                await self._closed.wait()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.session = None
+            self._ready.set()
+
+    async def ping(self, timeout: float) -> bool:
+        if not self.alive:
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout=timeout)
+            return True
+        except Exception:
+            return False
+
+    async def close(self) -> None:
+        self._closed.set()
+        if self._task is not None:
+            try:
+                await self._task
+            except Exception:
+                pass
+
+
+class PersistentSessions:
+    """Keeps one initialized session per server for the process lifetime.
+
+    Tools from `MultiServerMCPClient.get_tools()` open a new session on every
+    call, which for stdio servers means starting the server process again.
+    Tools from `PersistentSessions.get_tools()` reuse one session per server,
+    so a call costs a single JSON-RPC round trip. If a call fails and the
+    session no longer answers a ping, the session is reopened and the call
+    is retried once.
+
+    Usage:
+        async with PersistentSessions(client) as sessions:
+            tools = await sessions.get_tools()
+            # or: await get_cached_tools(sessions, TOOL_CACHE)
+    """
+
+    def __init__(self, client: MultiServerMCPClient, ping_timeout: float = 5.0):
+        """Initialize the session manager.
+
+        Args:
+            client: The multi-server client holding the connection configs.
+            ping_timeout: Seconds a session has to answer the ping that
+                decides whether a failed call is retried on a new session.
+        """
+        self.client = client
+        self.ping_timeout = ping_timeout
+        self.reconnects = 0
+        self._sessions: Dict[str, _ServerSession] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    @property
+    def connections(self) -> Dict[str, Any]:
+        return self.client.connections
+
+    async def __aenter__(self) -> "PersistentSessions":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def _session(self, server: str, dead: Optional[_ServerSession] = None) -> _ServerSession:
+        """Return the live session of a server, opening it if needed.
+
+        Args:
+            server: Server name from the client's connections.
+            dead: A session the caller saw fail; it is replaced unless
+                another task has replaced it already.
+        """
+        async with self._locks.setdefault(server, asyncio.Lock()):
+            current = self._sessions.get(server)
+            if current is not None and current is not dead and current.alive:
+                return current
+            if current is not None:
+                await current.close()
+                self.reconnects += 1
+            fresh = _ServerSession(self.client, server)
+            await fresh.start()
+            self._sessions[server] = fresh
+            return fresh
+
+    def _wrap(self, server: str, tool: BaseTool) -> BaseTool:
+        """Return a copy of `tool` that always calls the server's current session."""
+
+        async def call(**arguments: Any) -> Any:
+            current = await self._session(server)
+            try:
+                return await current.tools[tool.name].coroutine(**arguments)
+            except ToolException:
+                raise
+            except Exception:
+                # Only retry when the session itself is gone
+                if await current.ping(self.ping_timeout):
+                    raise
+                current = await self._session(server, dead=current)
+                return await current.tools[tool.name].coroutine(**arguments)
+
+        return tool.model_copy(update={"coroutine": call})
+
+    async def get_tools(self, *, server_name: Optional[str] = None) -> List[BaseTool]:
+        """Load tools bound to the persistent sessions.
+
+        Args:
+            server_name: Only load the tools of this server; all servers by default.
+
+        Returns:
+            The tools, in server order.
+        """
+        servers = [server_name] if server_name is not None else list(self.connections)
+        opened = await asyncio.gather(*(self._session(server) for server in servers))
+        return [self._wrap(s.server, tool) for s in opened for tool in s.tools.values()]
+
+    async def get_prompt(self, server_name: str, prompt_name: str, *, arguments: Optional[Dict[str, Any]] = None):
+        """Load a prompt over the server's persistent session."""
+        current = await self._session(server_name)
+        return await load_mcp_prompt(current.session, prompt_name, arguments=arguments)
+
+    async def close(self) -> None:
+        """Close every session."""
+        await asyncio.gather(*(s.close() for s in self._sessions.values()))
+        self._sessions = {}
@@ -22,6 +22,9 @@ from langchain_mcp_adapters.client import MultiServerMCPClient
 # Helper
 from helper import stream_agent_output
 
+# One long-lived session per server
+from mcp_tools import PersistentSessions
+
 
 # MCP connection setup
 client = MultiServerMCPClient(
@@ -54,31 +57,32 @@ PROMPT = """
 # Run the agent
 async def run_agent(client = client):
     # Keep sessions alive during agent execution
-    all_tools = await client.get_tools()
-    # Print just the tool names, not the full objects
-    print("Available tools:")
-    for i, tool in enumerate(all_tools, 1):
-        print(f"  {i}. {tool.name}")
-    print()
+    async with PersistentSessions(client) as sessions:
+        all_tools = await sessions.get_tools()
+        # Print just the tool names, not the full objects
+        print("Available tools:")
+        for i, tool in enumerate(all_tools, 1):
+            print(f"  {i}. {tool.name}")
+        print()
         
-    agent = create_react_agent(
-        model=model,
-        tools=all_tools,
-        prompt=PROMPT,
-        debug=False,
-        )
-
-    while True:
-        user_input = input("\nUser: ")
-        if user_input.lower() == 'quit':
-            break
+        agent = create_react_agent(
+            model=model,
+            tools=all_tools,
+            prompt=PROMPT,
+            debug=False,
+            )
+
+        while True:
+            user_input = input("\nUser: ")
+            if user_input.lower() == 'quit':
+                break
             
-        input_data = {"messages": [{"role": "user", "content": user_input}]}
+            input_data = {"messages": [{"role": "user", "content": user_input}]}
         
-        print("Agent: ", end="", flush=True)
+            print("Agent: ", end="", flush=True)
         
-        # Stream the response
-        await stream_agent_output(agent, input_data)
+            # Stream the response
+            await stream_agent_output(agent, input_data)
 
 if __name__ == "__main__":
     print(asyncio.run((run_agent())))
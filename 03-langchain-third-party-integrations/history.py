@@ -0,0 +1,253 @@
+# Bounds the conversation history replayed to the model on every turn
+
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+
+# Tag on the summarizer's model calls, so streaming UIs can skip their tokens
+SUMMARY_TAG = "history_summary"
+
+IFRAME_RE = re.compile(r"<iframe[\s\S]*?</iframe>", re.IGNORECASE)
+
+SUMMARY_INSTRUCTIONS = (
+    "Summarize the conversation below for an assistant that will continue it. "
+    "Keep the user's questions, the facts and numbers that were found, and any "
+    "open follow-ups. Leave out chart embeds and raw tool output. Be concise."
+)
+
+
+def _text(message: BaseMessage) -> str:
+    content = message.content
+    if isinstance(content, str):
+        return content
+    # Content blocks: keep the text parts only
+    return " ".join(block.get("text", "") if isinstance(block, dict) else str(block) for block in content)
+
+
+class HistoryManager:
+    """Keeps the prompt size flat in long conversations.
+
+    The checkpointer stores the whole conversation; this only changes what
+    is sent to the model:
+
+    - The current turn (from the latest user message on) is always sent in full
+    - Of the earlier turns, the last `keep_last` messages are sent, with
+      iframe embeds stripped and tool outputs over `max_tool_chars` cut
+    - Everything older is replaced by a summary. It is never computed while
+      a turn waits: `refresh` extends it in a background task after the
+      turn, and the prompt uses the last cached one. Messages the cached
+      summary doesn't cover yet are sent compacted instead, up to
+      `max_window` messages
+    """
+
+    def __init__(
+        self,
+        model: Any,
+        keep_last: int = 12,
+        max_tool_chars: int = 2000,
+        max_threads: int = 1024,
+        max_window: Optional[int] = None,
+        retry_after: float = 60.0,
+    ):
+        """Initialize the history manager.
+
+        Args:
+            model: Chat model used to write summaries, or None to drop old
+                messages without summarizing them.
+            keep_last: Number of earlier-turn messages kept verbatim.
+            max_tool_chars: Tool outputs from earlier turns longer than this
+                are truncated.
+            max_threads: Number of threads whose summary is kept in memory.
+            max_window: Most earlier-turn messages sent while the summary
+                lags behind; defaults to 4 * keep_last.
+            retry_after: Seconds to wait before summarizing a thread again
+                after a failed attempt.
+        """
+        self.model = model
+        self.keep_last = keep_last
+        self.max_tool_chars = max_tool_chars
+        self.max_threads = max_threads
+        self.max_window = max_window if max_window is not None else 4 * keep_last
+        self.retry_after = retry_after
+        # thread_id -> (id of the last summarized message, summary)
+        self._summaries: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+        # thread_id -> running background summary
+        self._tasks: Dict[str, "asyncio.Task[None]"] = {}
+        # thread_id -> monotonic time before which no new attempt is made
+        self._failed_until: Dict[str, float] = {}
+        self.summaries_computed = 0
+        self.summary_failures = 0
+
+    def compact(self, message: BaseMessage) -> BaseMessage:
+        """Return a copy of an earlier-turn message without large payloads."""
+        if isinstance(message, ToolMessage):
+            text = _text(message)
+            if len(text) > self.max_tool_chars:
+                text = text[: self.max_tool_chars] + f"\n[... {len(text) - self.max_tool_chars} characters omitted]"
+                return message.model_copy(update={"content": text})
+        elif isinstance(message, AIMessage) and "<iframe" in _text(message):
+            return message.model_copy(update={"content": IFRAME_RE.sub("[embedded visualization]", _text(message))})
+        return message
+
+    def _transcript(self, messages: Sequence[BaseMessage]) -> str:
+        lines = []
+        for message in messages:
+            text = _text(self.compact(message)).strip()
+            if isinstance(message, HumanMessage):
+                lines.append(f"User: {text}")
+            elif isinstance(message, ToolMessage):
+                lines.append(f"Tool ({message.name}): {text}")
+            elif isinstance(message, AIMessage):
+                if text:
+                    lines.append(f"Assistant: {text}")
+                for call in message.tool_calls:
+                    lines.append(f"Assistant called {call['name']} with {call['args']}")
+        return "\n".join(lines)
+
+    async def _summarize(self, previous: Optional[str], messages: Sequence[BaseMessage]) -> str:
+        transcript = self._transcript(messages)
+        if previous:
+            transcript = f"Summary so far:\n{previous}\n\nNew messages:\n{transcript}"
+        response = await self.model.ainvoke(
+            [SystemMessage(content=SUMMARY_INSTRUCTIONS), HumanMessage(content=transcript)],
+            config={"tags": [SUMMARY_TAG]},
+        )
+        return _text(response)
+
+    @staticmethod
+    def _skip_tool_results(earlier: Sequence[BaseMessage], start: int) -> int:
+        # Never start on a tool result whose tool call was cut off
+        while start < len(earlier) and isinstance(earlier[start], ToolMessage):
+            start += 1
+        return start
+
+    def _window_start(self, earlier: Sequence[BaseMessage]) -> int:
+        """Index of the first earlier-turn message sent verbatim."""
+        return self._skip_tool_results(earlier, max(0, len(earlier) - self.keep_last))
+
+    @staticmethod
+    def _covered(earlier: Sequence[BaseMessage], last_id: str) -> int:
+        """Number of leading messages covered by a summary ending at `last_id` (0 if absent)."""
+        for i in range(len(earlier) - 1, -1, -1):
+            if earlier[i].id == last_id:
+                return i + 1
+        return 0
+
+    async def summary_for(self, thread_id: str, older: Sequence[BaseMessage]) -> Optional[str]:
+        """Return a summary of `older`, reusing and extending the cached one.
+
+        Raises:
+            Exception: Whatever the summarizing model call raised.
+        """
+        if not older or self.model is None:
+            return None
+        last_id = older[-1].id or str(len(older))
+        cached = self._summaries.get(thread_id)
+        if cached is not None and cached[0] == last_id:
+            self._summaries.move_to_end(thread_id)
+            return cached[1]
+
+        # Only summarize the messages after the cached summary, if it still applies
+        previous, start = None, 0
+        if cached is not None:
+            covered = self._covered(older, cached[0])
+            if covered:
+                previous, start = cached[1], covered
+        summary = await self._summarize(previous, older[start:])
+        self.summaries_computed += 1
+        self._summaries[thread_id] = (last_id, summary)
+        self._summaries.move_to_end(thread_id)
+        while len(self._summaries) > self.max_threads:
+            self._summaries.popitem(last=False)
+        return summary
+
+    def refresh(self, thread_id: str, messages: Sequence[BaseMessage]) -> None:
+        """Bring a thread's summary up to date in the background.
+
+        Call after a turn with the thread's full conversation. Does nothing
+        if a refresh of the thread is already running or its last attempt
+        failed less than `retry_after` seconds ago.
+        """
+        if self.model is None or thread_id in self._tasks:
+            return
+        if time.monotonic() < self._failed_until.get(thread_id, 0.0):
+            return
+        # The next turn sends everything before this window start as the summary
+        older = list(messages[: self._window_start(messages)])
+        if not older:
+            return
+        cached = self._summaries.get(thread_id)
+        if cached is not None and cached[0] == (older[-1].id or str(len(older))):
+            return
+
+        async def run() -> None:
+            try:
+                await self.summary_for(thread_id, older)
+                self._failed_until.pop(thread_id, None)
+            except Exception as e:
+                print(f"Error summarizing history: {e}")
+                self.summary_failures += 1
+                self._failed_until[thread_id] = time.monotonic() + self.retry_after
+            finally:
+                self._tasks.pop(thread_id, None)
+
+        self._tasks[thread_id] = asyncio.create_task(run())
+
+    async def close(self) -> None:
+        """Cancel the background summaries, e.g. before the event loop exits."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def __call__(self, messages: List[BaseMessage], thread_id: str) -> List[BaseMessage]:
+        """Return the messages to send to the model for this step.
+
+        Never calls the model; the summary used is the last one `refresh`
+        finished for the thread.
+
+        Args:
+            messages: The full conversation from the checkpoint.
+            thread_id: The conversation thread, used to cache its summary.
+
+        Returns:
+            An optional summary message, the recent earlier-turn messages and
+            the current turn.
+        """
+        turn_start = 0
+        for i in range(len(messages) - 1, -1, -1):
+            if isinstance(messages[i], HumanMessage):
+                turn_start = i
+                break
+        earlier, current = messages[:turn_start], messages[turn_start:]
+
+        summary, covered = None, 0
+        cached = self._summaries.get(thread_id)
+        if cached is not None:
+            covered = self._covered(earlier, cached[0])
+            if covered:
+                summary = cached[1]
+                self._summaries.move_to_end(thread_id)
+
+        start = self._window_start(earlier)
+        if self.model is not None and covered < start:
+            # The summary lags behind: send what it doesn't cover yet, within max_window
+            start = self._skip_tool_results(earlier, max(covered, len(earlier) - self.max_window))
+        window: List[BaseMessage] = []
+        if summary:
+            window.append(SystemMessage(content=f"Summary of the earlier conversation:\n{summary}"))
+        window.extend(self.compact(message) for message in earlier[start:])
+        window.extend(current)
+        return window
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "summaries_computed": self.summaries_computed,
+            "summary_failures": self.summary_failures,
+            "summaries_running": len(self._tasks),
+            "threads_cached": len(self._summaries),
+        }
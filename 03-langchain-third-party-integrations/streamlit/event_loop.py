@@ -0,0 +1,103 @@
+"""
+One long-lived asyncio event loop for the whole Streamlit server process.
+
+Calling `asyncio.run` per interaction creates and tears down an event loop
+every time, and with it every MCP session, HTTP client and SQLite
+connection opened on that loop. `BackgroundLoop` runs a single loop in a
+daemon thread instead; script runs (any session, any rerun) submit work to
+it and the agent runtime stays warm between turns.
+
+Streamlit elements must be updated from the script thread, so async
+generators are consumed with `iterate`, which hands items over through a
+thread-safe queue.
+"""
+
+import asyncio
+import atexit
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, List, Optional
+
+import streamlit as st
+
+_DONE = object()
+
+
+class BackgroundLoop:
+    """An event loop running forever in its own thread, with a submit API."""
+
+    def __init__(self, name: str = "streamlit-event-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._shutdown_hooks: List[Callable[[], Awaitable[Any]]] = []
+        self._thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self._thread.start()
+        # Threads inherit the daemon flag of the thread that creates them, so
+        # workers started from coroutines on this loop (such as aiosqlite's
+        # connection thread) are daemons too and can't block interpreter
+        # exit. Daemon threads still run during atexit, so the shutdown
+        # hooks can close those connections cleanly there.
+        atexit.register(self.shutdown)
+
+    def submit(self, coro: Awaitable[Any]) -> Future:
+        """Schedule a coroutine on the loop; safe to call from any thread."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the loop and wait for its result."""
+        return self.submit(coro).result(timeout)
+
+    def iterate(self, agen: AsyncIterator[Any]) -> Iterator[Any]:
+        """Consume an async iterator on the loop, yielding its items here.
+
+        If the caller stops early (e.g. Streamlit interrupts the script for
+        a rerun), the async iterator is cancelled on the loop.
+        """
+        items: "queue.Queue[Any]" = queue.Queue()
+
+        async def pump():
+            try:
+                async for item in agen:
+                    items.put(item)
+            except BaseException as e:
+                items.put(e)
+                raise
+            finally:
+                items.put(_DONE)
+
+        future = self.submit(pump())
+        try:
+            while True:
+                item = items.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+
+    def add_shutdown_hook(self, hook: Callable[[], Awaitable[Any]]) -> None:
+        """Register a coroutine function to run on the loop at process exit.
+
+        Registering the same function again (e.g. on a rerun) is a no-op.
+        """
+        if hook not in self._shutdown_hooks:
+            self._shutdown_hooks.append(hook)
+
+    def shutdown(self, timeout: float = 10.0) -> None:
+        """Run the shutdown hooks and stop the loop."""
+        if self.loop.is_closed() or not self.loop.is_running():
+            return
+        for hook in self._shutdown_hooks:
+            try:
+                self.run(hook(), timeout)
+            except Exception as e:
+                print(f"Event loop shutdown hook failed: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+@st.cache_resource(show_spinner=False)
+def get_background_loop() -> BackgroundLoop:
+    """Return the process-wide loop, shared by all sessions and reruns."""
+    return BackgroundLoop()
@@ -1,6 +1,7 @@
-import asyncio
+import html
 import re
 import sys
+import uuid
 from pathlib import Path
 
 import streamlit as st
@@ -13,14 +14,24 @@ current_dir = Path(__file__).parent.absolute()
 parent_dir = current_dir.parent.absolute()
 sys.path.insert(0, str(parent_dir))
 
-from tako_graph import stream_agent_response, clear_chat_history_async
+from tako_graph import stream_agent_response, clear_chat_history_async, close_runtime, get_tool_output
+from event_loop import get_background_loop
+from stream_render import FlushScheduler, LiveMarkdown, StreamProcessor
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Page config
 # ──────────────────────────────────────────────────────────────────────────────
 st.set_page_config(page_title="MCP Agent with Streaming", page_icon="🤖", layout="wide")
 
+# One event loop per server process: the agent runtime, MCP sessions and
+# checkpointer connection stay open across reruns and sessions
+agent_loop = get_background_loop()
+agent_loop.add_shutdown_hook(close_runtime)
+
 EMBED_HEIGHT = 560  # fixed
+STREAM_FPS = 20  # max redraws per second while streaming
+STREAM_FLUSH_CHARS = 400  # redraw early once this much text is buffered
+HISTORY_PAGE_TURNS = 5  # past turns rendered per page; older ones stay collapsed
 
 # ──────────────────────────────────────────────────────────────────────────────
 # CSS
@@ -65,7 +76,7 @@ st.markdown("""
 
 def handle_clear_all():
     try:
-        asyncio.run(clear_chat_history_async(1))
+        agent_loop.run(clear_chat_history_async(st.session_state.thread_id))
     except Exception as e:
         st.warning(f"DB clear error (continuing): {e}")
     st.session_state.clear()
@@ -91,7 +102,9 @@ def render_steps_into(container, steps, last_rendered_count=0):
                     """, unsafe_allow_html=True)
             elif t == "tool_end":
                 output = step.get("output", "No output")
-                body = f"<strong>Output:</strong> {output}" if output != "No output" else ""
+                body = f"<strong>Output:</strong> {html.escape(str(output))}" if output != "No output" else ""
+                if step.get("truncated"):
+                    body += f" <em>… ({step.get('size', 0):,} characters in total)</em>"
                 st.markdown(
                     f"""
                     <div class="step-box completed-step">
@@ -100,57 +113,105 @@ def render_steps_into(container, steps, last_rendered_count=0):
                       {body}
                     </div>
                     """, unsafe_allow_html=True)
+                # Without a step id there is nothing to load (and no unique button key)
+                if step.get("truncated") and step.get("step_id") is not None:
+                    render_full_output(step["step_id"])
     return len(steps)
 
+def load_full_output(step_id):
+    st.session_state.setdefault("full_outputs", set()).add(step_id)
+
+def render_full_output(step_id):
+    """Lazy "load full output": fetched from the backend's side store only when asked for."""
+    if step_id not in st.session_state.get("full_outputs", set()):
+        st.button("📄 Load full output", key=f"full-output-{step_id}", on_click=load_full_output, args=(step_id,))
+        return
+    full_output = get_tool_output(st.session_state.thread_id, step_id)
+    if full_output is None:
+        st.caption("Full output is no longer available.")
+    else:
+        st.code(full_output, language=None)
+
 # Split text and iframes from LLM output
 IFRAME_SPLIT_RE = re.compile(r"(<iframe[\s\S]*?</iframe>)", re.IGNORECASE)
 IFRAME_TAG_RE   = re.compile(r"^\s*<iframe[\s\S]*?</iframe>\s*$", re.IGNORECASE)
 SRC_RE          = re.compile(r'src\s*=\s*["\']([^"\']+)["\']', re.IGNORECASE)
 
-def render_final_message_into(container, full_output_text: str):
+def split_segments(full_output_text: str):
+    """Split LLM output into ("text", part) and ("iframe", src) segments."""
+    segments = []
+    for part in IFRAME_SPLIT_RE.split(full_output_text or ""):
+        if not part or not part.strip():
+            continue
+        if IFRAME_TAG_RE.match(part):
+            m = SRC_RE.search(part)
+            segments.append(("iframe", m.group(1) if m else ""))
+        else:
+            segments.append(("text", part))
+    return segments
+
+def get_turn_segments(turn):
+    """Parsed segments of a past turn, computed once per turn id."""
+    cache = st.session_state.setdefault("segments", {})
+    if turn["id"] not in cache:
+        cache[turn["id"]] = split_segments(turn["response"])
+    return cache[turn["id"]]
+
+def render_final_message_into(container, full_output_text: str, segments=None):
     """
     Final/past-turn renderer:
       - Text chunks -> transparent text blocks
       - Iframe chunks -> white embed card with st_iframe
+    Pass already parsed `segments` to skip splitting the text again.
     """
-    parts = [p for p in IFRAME_SPLIT_RE.split(full_output_text or "") if p and p.strip()]
+    if segments is None:
+        segments = split_segments(full_output_text)
     with container:
-        for part in parts:
-            if IFRAME_TAG_RE.match(part):
-                m = SRC_RE.search(part)
-                src = m.group(1) if m else ""
-                if src:
-                    st_iframe(src, height=EMBED_HEIGHT, scrolling=True)
+        for kind, value in segments:
+            if kind == "iframe":
+                if value:
+                    st_iframe(value, height=EMBED_HEIGHT, scrolling=True)
                 else:
                     st.warning("Embed unavailable: no src")
             else:
-                st.markdown(f'<div class="msg-text-block">{part}</div>', unsafe_allow_html=True)
+                st.markdown(f'<div class="msg-text-block">{value}</div>', unsafe_allow_html=True)
 
-async def drive_stream(prompt, stream_placeholder, steps_container, notice_placeholder=None):
+def show_earlier_turns():
+    st.session_state.visible_turns = st.session_state.get("visible_turns", HISTORY_PAGE_TURNS) + HISTORY_PAGE_TURNS
+
+def drive_stream(prompt, thread_id, stream_placeholder, steps_container, notice_placeholder=None):
     """
     Streaming renderer:
-      - writes accumulating text into stream_placeholder as a transparent text block
+      - appends new text into stream_placeholder as transparent text blocks (iframes stripped)
       - shows a temporary notice if an <iframe> tag appears (actual iframe shown after completion)
     """
-    response_text = ""
+    processor = StreamProcessor()
+    live = LiveMarkdown(stream_placeholder.container(), '<div class="msg-text-block">{}</div>')
+    scheduler = FlushScheduler(live, fps=STREAM_FPS, max_buffered_chars=STREAM_FLUSH_CHARS)
     steps = []; display_step = 0; rendered_steps_count = 0
 
-    async for chunk in stream_agent_response(prompt):
+    for chunk in agent_loop.iterate(stream_agent_response(prompt, thread_id=thread_id)):
         ctype = chunk.get("type")
         if ctype == "text":
-            response_text += chunk.get("content", "")
-            stream_placeholder.markdown(f'<div class="msg-text-block">{response_text}</div>', unsafe_allow_html=True)
-            if notice_placeholder and "<iframe" in response_text:
+            iframe_detected = processor.iframe_seen
+            scheduler.push(processor.feed(chunk.get("content", "")))
+            if notice_placeholder and not iframe_detected and processor.iframe_seen:
                 notice_placeholder.info("📊 Interactive visualization will appear here once streaming completes...")
         elif ctype == "tool_start":
+            scheduler.flush()
             display_step += 1
             steps.append({"type":"tool_start","tool_name":chunk["tool_name"],"input":chunk.get("input", {}),"step_number":display_step})
             rendered_steps_count = render_steps_into(steps_container, steps, rendered_steps_count)
         elif ctype == "tool_end":
-            steps.append({"type":"tool_end","tool_name":chunk["tool_name"],"output":chunk.get("output","No output"),"step_number":display_step})
+            # Only the preview is kept; the full output stays in the backend's store
+            steps.append({"type":"tool_end","tool_name":chunk["tool_name"],"output":chunk.get("output","No output"),
+                          "step_id":chunk.get("step_id"),"truncated":chunk.get("truncated", False),
+                          "size":chunk.get("size", 0),"step_number":display_step})
             rendered_steps_count = render_steps_into(steps_container, steps, rendered_steps_count)
 
-    return response_text, steps
+    scheduler.push(processor.finish())
+    scheduler.flush()
+    return processor.text, steps
 
 # ──────────────────────────────────────────────────────────────────────────────
 # UI – Header
@@ -160,16 +221,27 @@ st.markdown("Ask questions and see the step-by-step process with intermediate re
 
 if "turns" not in st.session_state:
     st.session_state.turns = []   # {id, user, response, steps}
+if "thread_id" not in st.session_state:
+    st.session_state.thread_id = str(uuid.uuid4())   # one checkpoint thread per browser session
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Past turns
 # ──────────────────────────────────────────────────────────────────────────────
-for turn in st.session_state.turns:
+# Only the latest turns are rendered; older ones load a page at a time
+visible_turns = st.session_state.get("visible_turns", HISTORY_PAGE_TURNS)
+hidden_turns = max(0, len(st.session_state.turns) - visible_turns)
+if hidden_turns:
+    st.button(
+        f"⬆️ Show {min(HISTORY_PAGE_TURNS, hidden_turns)} earlier turns ({hidden_turns} hidden)",
+        on_click=show_earlier_turns,
+    )
+
+for turn in st.session_state.turns[hidden_turns:]:
     with st.chat_message("user"):
         st.markdown(turn["user"])
     with st.chat_message("assistant"):
         msg_container = st.container()
-        render_final_message_into(msg_container, turn["response"])
+        render_final_message_into(msg_container, turn["response"], get_turn_segments(turn))
         with st.expander("📋 Step-by-Step Process", expanded=False):
             inner_steps = st.container()
             render_steps_into(inner_steps, turn["steps"], 0)
@@ -194,9 +266,10 @@ if prompt:
         with st.expander("📋 Step-by-Step Process", expanded=True):
             expander_inner_steps = st.container()
 
-        async def run_turn():
-            response_text, steps = await drive_stream(
+        def run_turn():
+            response_text, steps = drive_stream(
                 prompt,
+                st.session_state.thread_id,
                 live_text,
                 expander_inner_steps,
                 notice_placeholder=live_notice
@@ -205,7 +278,9 @@ if prompt:
             # final render in same container
             live_notice.empty()
             live_text.empty()
-            render_final_message_into(turn_container, response_text)
+            segments = split_segments(response_text or "")
+            st.session_state.setdefault("segments", {})[turn_id] = segments
+            render_final_message_into(turn_container, response_text, segments)
 
             st.session_state.turns.append({
                 "id": turn_id,
@@ -214,7 +289,7 @@ if prompt:
                 "steps": steps,
             })
 
-        asyncio.run(run_turn())
+        run_turn()
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Sidebar
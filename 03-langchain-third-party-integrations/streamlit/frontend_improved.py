@@ -5,10 +5,11 @@ A clean, robust Streamlit application for interacting with MCP servers
 through LangChain agents with real-time streaming and step-by-step visualization.
 """
 
-import asyncio
+import html
 import re
 import sys
 import time
+import uuid
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
@@ -22,12 +23,16 @@ current_dir = Path(__file__).parent.absolute()
 parent_dir = current_dir.parent.absolute()
 sys.path.insert(0, str(parent_dir))
 
-from tako_graph import stream_agent_response, clear_chat_history_async
+from tako_graph import stream_agent_response, clear_chat_history_async, close_runtime, get_tool_output
+from event_loop import get_background_loop
+from stream_render import FlushScheduler, LiveMarkdown, StreamProcessor
 
 # Constants
 EMBED_HEIGHT = 560
 MAX_RETRIES = 3
-CHUNK_DELAY = 0.02  # Reduced delay for better performance
+STREAM_FPS = 20  # Maximum redraws per second while streaming
+STREAM_FLUSH_CHARS = 400  # Redraw early once this much text is buffered
+HISTORY_PAGE_TURNS = 5  # Past turns rendered per page; older ones stay collapsed
 
 # Compiled regex patterns (performance optimization)
 IFRAME_SPLIT_RE = re.compile(r"(<iframe[\s\S]*?</iframe>)", re.IGNORECASE)
@@ -43,6 +48,11 @@ st.set_page_config(
     layout="wide"
 )
 
+# One event loop per server process: the agent runtime, MCP sessions and
+# checkpointer connection stay open across reruns and sessions
+agent_loop = get_background_loop()
+agent_loop.add_shutdown_hook(close_runtime)
+
 # ──────────────────────────────────────────────────────────────────────────────
 # CSS Styles
 # ──────────────────────────────────────────────────────────────────────────────
@@ -140,7 +150,7 @@ def validate_iframe_url(url: str) -> bool:
 def handle_clear_all() -> None:
     """Clear database and UI state with error handling."""
     try:
-        asyncio.run(clear_chat_history_async(1))
+        agent_loop.run(clear_chat_history_async(st.session_state.thread_id))
         st.success("✅ Chat history cleared successfully!")
     except Exception as e:
         st.warning(f"⚠️ Database clear error (continuing): {e}")
@@ -185,7 +195,10 @@ def render_steps_into(container, steps: List[Dict[str, Any]], last_rendered_coun
                 elif step_type == "tool_end":
                     tool_name = step.get("tool_name", "Unknown")
                     output = step.get("output", "No output")
-                    output_text = f"<strong>Output:</strong> {output}" if output != "No output" else ""
+                    # Escaped: tool output is data, not markup
+                    output_text = f"<strong>Output:</strong> {html.escape(str(output))}" if output != "No output" else ""
+                    if step.get("truncated"):
+                        output_text += f" <em>… ({step.get('size', 0):,} characters in total)</em>"
                     
                     st.markdown(f"""
                     <div class="step-box completed-step">
@@ -195,34 +208,86 @@ def render_steps_into(container, steps: List[Dict[str, Any]], last_rendered_coun
                     </div>
                     """, unsafe_allow_html=True)
                     
+                    # Without a step id there is nothing to load (and no unique button key)
+                    if step.get("truncated") and step.get("step_id") is not None:
+                        render_full_output(step["step_id"])
+                    
             except Exception as e:
                 st.error(f"Error rendering step: {e}")
     
     return len(steps)
 
-def render_final_message_into(container, full_output_text: str) -> None:
-    """Render final message with optimized iframe handling - only process iframes when needed."""
+def load_full_output(step_id: str) -> None:
+    """Button callback: mark a step's full output as requested."""
+    st.session_state.setdefault("full_outputs", set()).add(step_id)
+
+def render_full_output(step_id: str) -> None:
+    """Render a "load full output" button, or the full output once requested.
+
+    Session state only holds the streamed preview; the full output is read
+    from the backend's bounded side store when the user asks for it.
+    """
+    if step_id not in st.session_state.get("full_outputs", set()):
+        st.button("📄 Load full output", key=f"full-output-{step_id}", on_click=load_full_output, args=(step_id,))
+        return
+    
+    full_output = get_tool_output(st.session_state.thread_id, step_id)
+    if full_output is None:
+        st.caption("Full output is no longer available.")
+    else:
+        st.code(full_output, language=None)
+
+def split_segments(full_output_text: str) -> List[Tuple[str, str]]:
+    """Split message text into ("text", part) and ("iframe", src) segments.
+
+    The src of an iframe is "" when it is missing or fails validation.
+    """
+    # Quick check: if no iframe tags, the whole message is one text segment
+    if "<iframe" not in full_output_text:
+        return [("text", full_output_text)]
+    
+    segments = []
+    for part in IFRAME_SPLIT_RE.split(full_output_text):
+        if not part or not part.strip():
+            continue
+        if IFRAME_TAG_RE.match(part):
+            src_match = SRC_RE.search(part)
+            src = src_match.group(1) if src_match else ""
+            segments.append(("iframe", src if validate_iframe_url(src) else ""))
+        else:
+            segments.append(("text", part))
+    return segments
+
+def get_turn_segments(turn: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """Return the parsed segments of a past turn, computed once per turn id."""
+    cache = st.session_state.setdefault("segments", {})
+    if turn["id"] not in cache:
+        cache[turn["id"]] = split_segments(turn["response"] or "")
+    return cache[turn["id"]]
+
+def render_final_message_into(
+    container,
+    full_output_text: str,
+    segments: Optional[List[Tuple[str, str]]] = None,
+) -> None:
+    """Render final message with optimized iframe handling - only process iframes when needed.
+
+    Pass already parsed `segments` (see get_turn_segments) to skip splitting the text again.
+    """
     if not full_output_text:
         return
     
     try:
-        # Quick check: if no iframe tags, render as simple text for performance
-        if "<iframe" not in full_output_text:
-            with container:
-                st.markdown(f'<div class="msg-text-block">{full_output_text}</div>', unsafe_allow_html=True)
-            return
-        
-        # Only split and process if iframes are present
-        parts = [p for p in IFRAME_SPLIT_RE.split(full_output_text) if p and p.strip()]
+        if segments is None:
+            segments = split_segments(full_output_text)
         
         with container:
-            for part in parts:
-                if IFRAME_TAG_RE.match(part):
+            for kind, value in segments:
+                if kind == "iframe":
                     # Handle iframe content
-                    src_match = SRC_RE.search(part)
-                    if src_match and validate_iframe_url(src_match.group(1)):
+                    if value:
                         try:
-                            st_iframe(src_match.group(1), height=EMBED_HEIGHT, scrolling=True)
+                            st_iframe(value, height=EMBED_HEIGHT, scrolling=True)
                         except Exception as e:
                             st.error(f"Could not load embed: {e}")
                             st.markdown(f'<div class="msg-text-block">Embed unavailable: {e}</div>', unsafe_allow_html=True)
@@ -230,60 +295,52 @@ def render_final_message_into(container, full_output_text: str) -> None:
                         st.warning("Embed unavailable: invalid or missing URL")
                 else:
                     # Handle text content
-                    if part.strip():
-                        st.markdown(f'<div class="msg-text-block">{part}</div>', unsafe_allow_html=True)
+                    st.markdown(f'<div class="msg-text-block">{value}</div>', unsafe_allow_html=True)
                         
     except Exception as e:
         st.error(f"Error rendering message: {e}")
         st.markdown(f'<div class="msg-text-block">{full_output_text}</div>', unsafe_allow_html=True)
 
-async def drive_stream(
+def drive_stream(
     prompt: str, 
+    thread_id: str,
     stream_placeholder, 
     steps_container, 
     notice_placeholder=None
 ) -> Tuple[str, List[Dict[str, Any]]]:
-    """Stream agent response with optimized performance - no iframe detection during streaming."""
-    response_text = ""
+    """Stream agent response with optimized performance - no iframe detection during streaming.
+
+    Chunks go through a StreamProcessor, which strips iframes and
+    visualization headers incrementally, and the visible text is appended
+    to a LiveMarkdown, so each chunk costs the same however long the
+    answer gets. Redraws are coalesced to STREAM_FPS frames per second.
+    """
+    processor = StreamProcessor()
+    live = LiveMarkdown(stream_placeholder.container(), '<div class="msg-text-block">{}</div>')
+    scheduler = FlushScheduler(live, fps=STREAM_FPS, max_buffered_chars=STREAM_FLUSH_CHARS)
     steps = []
     display_step = 0
     rendered_steps_count = 0
     retry_count = 0
-    iframe_detected = False  # Track if iframe was detected during streaming
     
     try:
-        async for chunk in stream_agent_response(prompt):
+        for chunk in agent_loop.iterate(stream_agent_response(prompt, thread_id=thread_id)):
             try:
                 chunk_type = chunk.get("type")
                 
                 if chunk_type == "text":
                     chunk_content = safe_get_chunk_content(chunk)
-                    response_text += chunk_content
-                    
-                    # Filter out iframe content during streaming to prevent premature rendering
-                    streaming_text = response_text
-                    if "<iframe" in response_text:
-                        # Remove iframe tags and content for streaming display
-                        streaming_text = re.sub(r'<iframe[\s\S]*?</iframe>', '', response_text)
-                        # Also remove any remaining iframe-related text
-                        streaming_text = re.sub(r'\*\*Interactive Visualization:\*\*.*?(?=\n\n|\n\*\*|$)', '', streaming_text, flags=re.DOTALL)
-                        streaming_text = streaming_text.strip()
+                    iframe_detected = processor.iframe_seen
                     
-                    # Render streaming text (without iframe content)
-                    stream_placeholder.markdown(
-                        f'<div class="msg-text-block">{streaming_text}</div>', 
-                        unsafe_allow_html=True
-                    )
+                    # Buffer only the new text (iframe content is filtered out)
+                    scheduler.push(processor.feed(chunk_content))
                     
                     # Only check for iframe once and show notice
-                    if notice_placeholder and not iframe_detected and "<iframe" in response_text:
-                        iframe_detected = True
+                    if notice_placeholder and not iframe_detected and processor.iframe_seen:
                         notice_placeholder.info("📊 Interactive visualization will appear here once streaming completes...")
                     
-                    # Small delay for streaming effect
-                    await asyncio.sleep(CHUNK_DELAY)
-                    
                 elif chunk_type == "tool_start":
+                    scheduler.flush()  # Show the text so far before the tool runs
                     display_step += 1
                     steps.append({
                         "type": "tool_start",
@@ -297,7 +354,10 @@ async def drive_stream(
                     steps.append({
                         "type": "tool_end",
                         "tool_name": chunk.get("tool_name", "Unknown"),
-                        "output": chunk.get("output", "No output"),
+                        "output": chunk.get("output", "No output"),  # Preview only
+                        "step_id": chunk.get("step_id"),
+                        "truncated": chunk.get("truncated", False),
+                        "size": chunk.get("size", 0),
                         "step_number": display_step
                     })
                     rendered_steps_count = render_steps_into(steps_container, steps, rendered_steps_count)
@@ -312,7 +372,9 @@ async def drive_stream(
     except Exception as e:
         st.error(f"Streaming error: {e}")
     
-    return response_text, steps
+    scheduler.push(processor.finish())
+    scheduler.flush()
+    return processor.text, steps
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Main UI
@@ -350,14 +412,30 @@ def render_sidebar() -> None:
             "- Blog: [Personal Blog](https://woodychang21.github.io/Personal-Blog/)"
         )
 
+def show_earlier_turns() -> None:
+    """Reveal one more page of past turns."""
+    st.session_state.visible_turns = st.session_state.get("visible_turns", HISTORY_PAGE_TURNS) + HISTORY_PAGE_TURNS
+
 def render_chat_history() -> None:
-    """Render past chat turns."""
-    for turn in st.session_state.turns:
+    """Render past chat turns.
+
+    Only the latest HISTORY_PAGE_TURNS turns are rendered; older ones are
+    revealed a page at a time, so reruns stay fast in long sessions.
+    """
+    visible_turns = st.session_state.get("visible_turns", HISTORY_PAGE_TURNS)
+    hidden_turns = max(0, len(st.session_state.turns) - visible_turns)
+    if hidden_turns:
+        st.button(
+            f"⬆️ Show {min(HISTORY_PAGE_TURNS, hidden_turns)} earlier turns ({hidden_turns} hidden)",
+            on_click=show_earlier_turns,
+        )
+    
+    for turn in st.session_state.turns[hidden_turns:]:
         with st.chat_message("user"):
             st.markdown(turn["user"])
         with st.chat_message("assistant"):
             msg_container = st.container()
-            render_final_message_into(msg_container, turn["response"])
+            render_final_message_into(msg_container, turn["response"], get_turn_segments(turn))
             with st.expander("📋 Step-by-Step Process", expanded=False):
                 inner_steps = st.container()
                 render_steps_into(inner_steps, turn["steps"], 0)
@@ -377,10 +455,11 @@ def handle_new_message(prompt: str) -> None:
         with st.expander("📋 Step-by-Step Process", expanded=True):
             expander_inner_steps = st.container()
 
-        async def run_turn():
+        def run_turn():
             try:
-                response_text, steps = await drive_stream(
+                response_text, steps = drive_stream(
                     prompt,
+                    st.session_state.thread_id,
                     live_text,
                     expander_inner_steps,
                     notice_placeholder=live_notice
@@ -389,7 +468,9 @@ def handle_new_message(prompt: str) -> None:
                 # Final render
                 live_notice.empty()
                 live_text.empty()
-                render_final_message_into(turn_container, response_text)
+                segments = split_segments(response_text or "")
+                st.session_state.setdefault("segments", {})[turn_id] = segments
+                render_final_message_into(turn_container, response_text, segments)
 
                 # Persist turn
                 st.session_state.turns.append({
@@ -402,7 +483,7 @@ def handle_new_message(prompt: str) -> None:
             except Exception as e:
                 st.error(f"Error processing request: {e}")
 
-        asyncio.run(run_turn())
+        run_turn()
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Main Application
@@ -417,6 +498,9 @@ def main():
     # Initialize session state
     if "turns" not in st.session_state:
         st.session_state.turns = []
+    if "thread_id" not in st.session_state:
+        # One checkpoint thread per browser session
+        st.session_state.thread_id = str(uuid.uuid4())
 
     # Render UI components
     render_sidebar()
@@ -0,0 +1,238 @@
+"""
+Incremental rendering of streamed agent text for the Streamlit frontends.
+
+Re-rendering the whole accumulated answer on every chunk costs O(n) per
+chunk, O(n²) per answer. The helpers here keep the per-chunk cost constant:
+
+- `StreamProcessor` strips `<iframe>` blocks and "Interactive Visualization"
+  headers from the chunks as they arrive, with a small state machine, and
+  returns only the new visible text
+- `LiveMarkdown` writes finished paragraphs into their own elements once and
+  only keeps re-rendering the unfinished last paragraph
+- `FlushScheduler` buffers chunks and redraws at a fixed frame rate (or once
+  enough text is buffered) instead of on every chunk
+"""
+
+import time
+from typing import Callable, List
+
+IFRAME_OPEN = "<iframe"
+IFRAME_CLOSE = "</iframe>"
+VIZ_HEADER = "**interactive visualization:**"
+# A header is dropped up to the next blank line or bold line
+HEADER_ENDS = ("\n\n", "\n**")
+
+TEXT, IFRAME, HEADER = "text", "iframe", "header"
+
+
+def _partial_suffix(lower: str, start: int, markers) -> int:
+    """Return where a trailing prefix of any marker begins (len(lower) if none)."""
+    keep = 0
+    for marker in markers:
+        for size in range(min(len(marker) - 1, len(lower) - start), keep, -1):
+            if lower.endswith(marker[:size]):
+                keep = size
+                break
+    return len(lower) - keep
+
+
+class StreamProcessor:
+    """Splits streamed text into the full answer and the part shown while streaming.
+
+    Usage:
+        processor = StreamProcessor()
+        for chunk in chunks:
+            visible_delta = processor.feed(chunk)
+        visible_delta = processor.finish()
+        full_text = processor.text
+    """
+
+    def __init__(self):
+        self._parts: List[str] = []
+        self._pending = ""
+        self._state = TEXT
+        self.iframe_seen = False
+
+    @property
+    def text(self) -> str:
+        """The full answer received so far, iframes included."""
+        return "".join(self._parts)
+
+    def feed(self, chunk: str) -> str:
+        """Consume one chunk and return the newly visible text.
+
+        Text that might be the start of an iframe tag or header is held back
+        until the next chunk shows what it is.
+        """
+        self._parts.append(chunk)
+        data = self._pending + chunk
+        self._pending = ""
+        lower = data.lower()
+        out: List[str] = []
+        i = 0
+        while i < len(data):
+            if self._state == TEXT:
+                found = [(j, m) for m in (IFRAME_OPEN, VIZ_HEADER) for j in [lower.find(m, i)] if j >= 0]
+                if found:
+                    j, marker = min(found)
+                    out.append(data[i:j])
+                    i = j + len(marker)
+                    self._state = IFRAME if marker == IFRAME_OPEN else HEADER
+                    self.iframe_seen = self.iframe_seen or marker == IFRAME_OPEN
+                    continue
+                keep_from = _partial_suffix(lower, i, (IFRAME_OPEN, VIZ_HEADER))
+                out.append(data[i:keep_from])
+                self._pending = data[keep_from:]
+                break
+            elif self._state == IFRAME:
+                j = lower.find(IFRAME_CLOSE, i)
+                if j >= 0:
+                    i = j + len(IFRAME_CLOSE)
+                    self._state = TEXT
+                    continue
+                self._pending = data[_partial_suffix(lower, i, (IFRAME_CLOSE,)):]
+                break
+            else:  # HEADER
+                ends = [j for end in HEADER_ENDS for j in [data.find(end, i)] if j >= 0]
+                if ends:
+                    # Keep the terminator: it separates the surrounding text
+                    i = min(ends)
+                    self._state = TEXT
+                    continue
+                self._pending = data[_partial_suffix(data, i, HEADER_ENDS):]
+                break
+        return "".join(out)
+
+    def finish(self) -> str:
+        """Return any held-back text once the stream has ended."""
+        pending, self._pending = self._pending, ""
+        return pending if self._state == TEXT else ""
+
+
+class LiveMarkdown:
+    """Streams text into a Streamlit container at constant cost per update.
+
+    Finished paragraphs (ending in a blank line outside a code fence) are
+    written into their own element once; only the last, unfinished
+    paragraph is re-rendered on each update. Once the live text grows past
+    `max_live_chars` without a blank line (a long list, or a long code
+    block), its finished lines are frozen too; an open code fence is closed
+    in the frozen part and reopened for the rest.
+    """
+
+    def __init__(self, container, template: str = "{}", max_live_chars: int = 2000):
+        """Initialize the renderer.
+
+        Args:
+            container: Streamlit container (or placeholder container) to write into.
+            template: HTML/markdown template for each block, with `{}` for the text.
+            max_live_chars: Size at which live text is split at its last line break.
+        """
+        self.container = container
+        self.template = template
+        self.max_live_chars = max_live_chars
+        self._live = container.empty()
+        self._tail = ""
+        self._dirty = False
+
+    def _write(self, placeholder, text: str) -> None:
+        placeholder.markdown(self.template.format(text), unsafe_allow_html=True)
+
+    def _freeze(self, text: str, rest: str) -> None:
+        """Write `text` into the live element for good and keep `rest` live."""
+        self._write(self._live, text)
+        self._live = self.container.empty()
+        self._tail = rest
+
+    def append(self, delta: str) -> None:
+        """Add streamed text; finished paragraphs are frozen right away."""
+        if not delta:
+            return
+        self._tail += delta
+        self._dirty = True
+        cut = self._tail.rfind("\n\n")
+        if cut > 0:
+            head = self._tail[:cut]
+            if head.count("```") % 2 == 0:
+                if head.strip():
+                    self._freeze(head, self._tail[cut + 2:])
+            else:
+                # Don't split a fenced code block at its blank lines, but
+                # freeze the paragraphs before it
+                before = self._tail.rfind("\n\n", 0, head.rfind("```"))
+                if before > 0 and self._tail[:before].strip():
+                    self._freeze(self._tail[:before], self._tail[before + 2:])
+
+        if len(self._tail) <= self.max_live_chars:
+            return
+        last_line = self._tail.rfind("\n")
+        if self._tail.count("```") % 2 == 1:
+            # A long open code block: freeze its finished lines as a closed
+            # block and reopen the fence (same info string) for the rest
+            opener = self._tail.rfind("```")
+            fence_end = self._tail.find("\n", opener)
+            if fence_end != -1 and last_line > fence_end:
+                fence = self._tail[opener:fence_end]
+                self._freeze(self._tail[:last_line] + "\n```", fence + "\n" + self._tail[last_line + 1:])
+        elif last_line > 0 and self._tail[:last_line].count("```") % 2 == 0 and self._tail[:last_line].strip():
+            # A long list or paragraph without blank lines: freeze its finished lines
+            self._freeze(self._tail[:last_line], self._tail[last_line + 1:])
+
+    def render(self) -> None:
+        """Redraw the unfinished paragraph if it changed."""
+        if self._dirty:
+            if self._tail:
+                self._write(self._live, self._tail)
+            else:
+                self._live.empty()
+            self._dirty = False
+
+
+class FlushScheduler:
+    """Coalesces streamed text into at most `fps` redraws per second.
+
+    Chunks are appended to the `LiveMarkdown` right away, but the live
+    element is only redrawn when a frame is due or `max_buffered_chars` of
+    text has arrived since the last redraw. Call `flush()` on pauses in the
+    stream (e.g. tool calls) and at the end so no text is left undrawn.
+    """
+
+    def __init__(
+        self,
+        live: LiveMarkdown,
+        fps: float = 20.0,
+        max_buffered_chars: int = 400,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Initialize the scheduler.
+
+        Args:
+            live: Renderer to flush into.
+            fps: Maximum redraws per second.
+            max_buffered_chars: Redraw early once this much text is buffered.
+            clock: Monotonic time source, in seconds.
+        """
+        self.live = live
+        self.interval = 1.0 / fps
+        self.max_buffered_chars = max_buffered_chars
+        self.clock = clock
+        self._buffered = 0
+        self._last_flush = float("-inf")
+        self.flushes = 0
+
+    def push(self, delta: str) -> None:
+        """Add text and redraw if a frame is due."""
+        if not delta:
+            return
+        self.live.append(delta)
+        self._buffered += len(delta)
+        if self._buffered >= self.max_buffered_chars or self.clock() - self._last_flush >= self.interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """Redraw now if anything is buffered."""
+        if self._buffered:
+            self.live.render()
+            self.flushes += 1
+            self._buffered = 0
+            self._last_flush = self.clock()
@@ -1,5 +1,11 @@
 # from langgraph_supervisor import create_supervisor
+import argparse
 import asyncio
+import aiosqlite
+import threading
+from collections import OrderedDict
+from contextlib import AsyncExitStack
+from langchain_core.messages import SystemMessage
 from langchain_openai import ChatOpenAI
 
 # Import the agent
@@ -19,6 +25,12 @@ print(env_path)
 # MCP
 from langchain_mcp_adapters.client import MultiServerMCPClient
 
+# Prompt-size bounding for long conversations
+from history import SUMMARY_TAG, HistoryManager
+
+# Client-side tool call caching
+from mcp_tools import CachePolicy, PersistentSessions, ToolCallCache, get_cached_tools
+
 
 # MCP connection setup
 # This is for Tako MCP server running in Docker
@@ -37,160 +49,501 @@ DEPLOYMENT_NAME = os.getenv("deployment_name")
 model = ChatOpenAI(model = DEPLOYMENT_NAME, temperature=0.0)
 
 
-# Global agent instance for Streamlit
-_agent = None
+# Global agent runtime for Streamlit (see get_runtime)
+_runtime = None
+
+DEFAULT_PROMPT = "Use the tools available to you to answer the question with data and visualizations."
 
 os.makedirs("checkpoint", exist_ok=True)
+
+# Tako queries are idempotent, so identical calls are answered from the cache
+# for 10 minutes. Results are also kept on disk to survive restarts; the
+# file holds at most TOOL_CACHE_DISK_ENTRIES payloads and expired ones are purged.
+TOOL_CACHE = {"tako": CachePolicy(ttl=600)}
+TOOL_CACHE_DISK_ENTRIES = 2000
+tool_cache = ToolCallCache("checkpoint/tool_cache.sqlite", max_disk_entries=TOOL_CACHE_DISK_ENTRIES)
+
+CHECKPOINT_PATH = "checkpoint/tako_checkpoint.sqlite"
+CHECKPOINT_BUSY_TIMEOUT_MS = 5000
+
+# Thread used when the caller doesn't have a session of its own (CLI runs)
+DEFAULT_THREAD_ID = "1"
+
+# Shared checkpointer per event loop (see get_checkpointer)
+_checkpointers = {}
+
+async def _open_checkpointer():
+    conn = await aiosqlite.connect(CHECKPOINT_PATH)
+    # Only takes effect on a new database; compact_checkpoints converts old ones
+    await conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    # WAL lets readers run alongside the writer; NORMAL is durable in WAL
+    # mode except for the last commits on power loss
+    await conn.execute("PRAGMA journal_mode=WAL")
+    await conn.execute("PRAGMA synchronous=NORMAL")
+    await conn.execute(f"PRAGMA busy_timeout={CHECKPOINT_BUSY_TIMEOUT_MS}")
+    saver = AsyncSqliteSaver(conn)
+    await saver.setup()
+    # The checkpoints and writes primary keys start with thread_id, so
+    # per-thread lookups stay index range scans however many threads there
+    # are; optimize keeps the planner statistics for those indexes current
+    await conn.execute("PRAGMA optimize")
+    return saver
+
+async def get_checkpointer():
+    """Return the process-wide AsyncSqliteSaver, opening it on first use.
+
+    Every agent turn and history operation shares one connection. aiosqlite
+    runs all statements of a connection on a single worker thread and the
+    saver holds a lock around each write, so writes are serialized through
+    one writer instead of competing for the database lock.
+
+    The connection is bound to the event loop it was opened on, so one
+    saver is kept per running loop.
+    """
+    loop = asyncio.get_running_loop()
+    # Drop savers of loops that have finished (e.g. earlier asyncio.run calls)
+    for stale in [l for l in _checkpointers if l.is_closed()]:
+        del _checkpointers[stale]
+    if loop not in _checkpointers:
+        # Stored as a task so concurrent first callers share one connection
+        _checkpointers[loop] = asyncio.ensure_future(_open_checkpointer())
+    try:
+        return await asyncio.shield(_checkpointers[loop])
+    except Exception:
+        _checkpointers.pop(loop, None)
+        raise
+
+async def close_checkpointer():
+    """Close the current loop's shared checkpointer connection"""
+    opening = _checkpointers.pop(asyncio.get_running_loop(), None)
+    if opening is not None:
+        saver = await opening
+        await saver.conn.execute("PRAGMA optimize")
+        await saver.conn.close()
+
 async def clear_chat_history_async(thread_id):
     """Clear chat history for a specific thread_id using AsyncSqliteSaver"""
     try:
-        async with AsyncSqliteSaver.from_conn_string("checkpoint/tako_checkpoint.sqlite") as saver:
-            # Use the saver's connection to clear specific thread
-            await saver.adelete_thread(str(thread_id))
-            print(f"✅ Cleared chat history for thread_id: {thread_id}")
+        saver = await get_checkpointer()
+        # Use the saver's connection to clear specific thread
+        await saver.adelete_thread(str(thread_id))
+        print(f"✅ Cleared chat history for thread_id: {thread_id}")
     except Exception as e:
         print(f"❌ Error clearing async history: {e}")
 
-async def get_enhanced_prompt(user_input: str) -> str:
-    """Get an enhanced prompt using MCP prompts"""
+# Default number of checkpoints kept per thread by compact_checkpoints
+CHECKPOINT_KEEP_LAST = 20
+
+async def compact_checkpoints(keep_last=CHECKPOINT_KEEP_LAST, thread_id=None):
+    """Prune old checkpoints and give the freed space back to the OS.
+
+    Every agent step stores a full checkpoint, so only the newest ones are
+    needed to resume a conversation. This keeps the last `keep_last`
+    checkpoints per thread (and namespace), deletes writes that no longer
+    belong to a checkpoint, then runs an incremental vacuum. A database
+    created before incremental auto-vacuum was enabled is converted with
+    one full VACUUM.
+
+    Args:
+        keep_last: Number of checkpoints to keep per thread.
+        thread_id: Only compact this thread; all threads by default.
+
+    Returns:
+        A dict with the number of checkpoints and writes deleted and the
+        database size in bytes before and after.
+    """
+    if keep_last < 1:
+        raise ValueError("keep_last must be at least 1")
+    saver = await get_checkpointer()
+    conn = saver.conn
+    thread_filter = "WHERE thread_id = ?" if thread_id is not None else ""
+    write_filter = "w.thread_id = ? AND" if thread_id is not None else ""
+    thread_args = (str(thread_id),) if thread_id is not None else ()
+
+    async def pragma(statement):
+        async with conn.execute(statement) as cursor:
+            row = await cursor.fetchone()
+        return row[0] if row else None
+
+    # Hold the saver's lock so no agent write interleaves with the compaction
+    async with saver.lock:
+        size_before = await pragma("PRAGMA page_count") * await pragma("PRAGMA page_size")
+
+        # checkpoint_id is a time-ordered uuid6, so DESC is newest first
+        cursor = await conn.execute(
+            f"""
+            DELETE FROM checkpoints WHERE rowid IN (
+                SELECT rowid FROM (
+                    SELECT rowid, ROW_NUMBER() OVER (
+                        PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC
+                    ) AS rank
+                    FROM checkpoints {thread_filter}
+                ) WHERE rank > ?
+            )
+            """,
+            thread_args + (keep_last,),
+        )
+        checkpoints_deleted = cursor.rowcount
+        cursor = await conn.execute(
+            f"""
+            DELETE FROM writes WHERE rowid IN (
+                SELECT w.rowid FROM writes w
+                WHERE {write_filter} NOT EXISTS (
+                    SELECT 1 FROM checkpoints c
+                    WHERE c.thread_id = w.thread_id
+                      AND c.checkpoint_ns = w.checkpoint_ns
+                      AND c.checkpoint_id = w.checkpoint_id
+                )
+            )
+            """,
+            thread_args,
+        )
+        writes_deleted = cursor.rowcount
+        await conn.commit()
+
+        if await pragma("PRAGMA auto_vacuum") == 2:  # INCREMENTAL
+            # executescript steps the pragma to completion; execute() would
+            # stop after its first step and free a single page
+            await conn.executescript("PRAGMA incremental_vacuum;")
+        else:
+            await conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            await conn.execute("VACUUM")
+        await conn.commit()
+        await conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        size_after = await pragma("PRAGMA page_count") * await pragma("PRAGMA page_size")
+
+    return {
+        "checkpoints_deleted": checkpoints_deleted,
+        "writes_deleted": writes_deleted,
+        "bytes_before": size_before,
+        "bytes_after": size_after,
+    }
+
+# Placeholder sent instead of the user's text when fetching the search
+# prompt template, so the template can be fetched once and reused
+PROMPT_TEXT_PLACEHOLDER = "__TAKO_USER_TEXT__"
+_prompt_template = None
+_prompt_templatable = True
+
+def build_enhanced_prompt(search_prompt) -> str:
+    """Wrap the MCP search prompt with the visualization instructions"""
+    # Combine with base instructions
+    enhanced_prompt = f"""
+    You are an expert data analyst with access to Tako's knowledge base and visualization tools.
+    
+    {search_prompt}
+    
+   Visualization Instructions:
+    - When you get visualization results from Tako tools, ALWAYS provide BOTH:
+      1. An embedded iframe for inline viewing (if supported)
+      2. A clickable link as fallback for full interactive access
+    
+    - Format for each visualization:
+      **Interactive Visualization:**
+      
+      <iframe src="EMBED_URL" width="100%" height="1000" frameborder="0" scrolling="yes" style="border-radius: 8px; margin: 10px 0; overflow: auto; border: 1px solid #ddd; box-shadow: 0 2px 4px rgba(0,0,0,0.1);"></iframe>
+      
+      **🔗 Full Interactive View:** [Open in New Tab](WEBPAGE_URL)
+      - **Description:** [Brief description of what the chart shows]
+      - **Data Source:** [Source information if available]
+    
+    - If multiple visualizations are available, provide each one separately with clear titles
+    - Always extract both the webpage URL and embed URL from Tako tool responses
+    - Use smaller iframe height (300px) to fit better in chat
+    - Include clickable links as backup for better accessibility
+    - Include relevant metadata like data sources and methodology
+    
+    Additional instructions:
+    - Always use the available Tako tools to get real-time data
+    - Be specific and data-driven in your responses
+    - If you need to search multiple aspects, make separate tool calls for each
+    - Prioritize providing clear, accessible links to interactive visualizations
+    - Include context about what each visualization represents
+    """
+    return enhanced_prompt
+
+async def get_enhanced_prompt(user_input: str, sessions) -> str:
+    """Get an enhanced prompt using MCP prompts
+
+    The prompt is fetched once with a placeholder and cached as a template,
+    so later turns only substitute the user's text. If the server does not
+    echo the placeholder back, the prompt is fetched on every turn instead.
+    Fetches go over the runtime's persistent Tako session.
+
+    Args:
+        user_input: The user's message.
+        sessions: The runtime's `PersistentSessions`.
+    """
+    global _prompt_template, _prompt_templatable
     try:
-        # Use the MCP prompt to generate a better system prompt
-        search_prompt = await client.get_prompt("tako", "generate_search_tako_prompt", arguments={"text": user_input})
+        if _prompt_template is None and _prompt_templatable:
+            # Use the MCP prompt to generate a better system prompt
+            search_prompt = await sessions.get_prompt("tako", "generate_search_tako_prompt", arguments={"text": PROMPT_TEXT_PLACEHOLDER})
+            template = build_enhanced_prompt(search_prompt)
+            if PROMPT_TEXT_PLACEHOLDER in template:
+                _prompt_template = template
+            else:
+                _prompt_templatable = False
         
-        # Combine with base instructions
-        enhanced_prompt = f"""
-        You are an expert data analyst with access to Tako's knowledge base and visualization tools.
+        if _prompt_template is not None:
+            return _prompt_template.replace(PROMPT_TEXT_PLACEHOLDER, user_input)
         
-        {search_prompt}
-        
-       Visualization Instructions:
-        - When you get visualization results from Tako tools, ALWAYS provide BOTH:
-          1. An embedded iframe for inline viewing (if supported)
-          2. A clickable link as fallback for full interactive access
-        
-        - Format for each visualization:
-          **Interactive Visualization:**
-          
-          <iframe src="EMBED_URL" width="100%" height="1000" frameborder="0" scrolling="yes" style="border-radius: 8px; margin: 10px 0; overflow: auto; border: 1px solid #ddd; box-shadow: 0 2px 4px rgba(0,0,0,0.1);"></iframe>
-          
-          **🔗 Full Interactive View:** [Open in New Tab](WEBPAGE_URL)
-          - **Description:** [Brief description of what the chart shows]
-          - **Data Source:** [Source information if available]
-        
-        - If multiple visualizations are available, provide each one separately with clear titles
-        - Always extract both the webpage URL and embed URL from Tako tool responses
-        - Use smaller iframe height (300px) to fit better in chat
-        - Include clickable links as backup for better accessibility
-        - Include relevant metadata like data sources and methodology
-        
-        Additional instructions:
-        - Always use the available Tako tools to get real-time data
-        - Be specific and data-driven in your responses
-        - If you need to search multiple aspects, make separate tool calls for each
-        - Prioritize providing clear, accessible links to interactive visualizations
-        - Include context about what each visualization represents
-        """
-        
-        return enhanced_prompt
+        search_prompt = await sessions.get_prompt("tako", "generate_search_tako_prompt", arguments={"text": user_input})
+        return build_enhanced_prompt(search_prompt)
         
     except Exception as e:
         print(f"Error getting MCP prompt: {e}")
         # Fallback to basic prompt
-        return "Use the tools available to you to answer the question with data and visualizations."
+        return DEFAULT_PROMPT
+
+# Messages from earlier turns sent verbatim; older ones are summarized
+HISTORY_KEEP_LAST = 12
+# Earlier-turn tool outputs (Tako payloads) are cut to this many characters
+HISTORY_MAX_TOOL_CHARS = 2000
+history = HistoryManager(model, keep_last=HISTORY_KEEP_LAST, max_tool_chars=HISTORY_MAX_TOOL_CHARS)
+
+# Run-config key of the per-turn system prompt. LangChain copies other
+# string `configurable` values into run and checkpoint metadata, which would
+# store the whole prompt in every checkpoint row; "__" keys are skipped.
+SYSTEM_PROMPT_KEY = "__system_prompt"
+
+async def dynamic_prompt(state, config):
+    """Prepend the per-turn system prompt passed in the run config
+
+    The checkpointed conversation is passed through the history manager, so
+    the prompt stays bounded however long the thread gets.
+    """
+    configurable = config.get("configurable", {})
+    system_prompt = configurable.get(SYSTEM_PROMPT_KEY) or DEFAULT_PROMPT
+    thread_id = str(configurable.get("thread_id", DEFAULT_THREAD_ID))
+    messages = await history(state["messages"], thread_id)
+    return [SystemMessage(content=system_prompt)] + messages
+
+class AgentRuntime:
+    """Tools, checkpointer and agent built once and reused across turns.
+
+    The system prompt changes every turn, so it is not baked into the agent;
+    pass it as config["configurable"][SYSTEM_PROMPT_KEY] instead.
+    """
 
-async def stream_agent_response(user_input):
-    """Stream agent response for Streamlit frontend"""
+    def __init__(self):
+        self.agent = None
+        self.sessions = None
+        self.loop = None
+        self._exit_stack = AsyncExitStack()
+        self._lock = asyncio.Lock()
+
+    async def start(self):
+        """Load the tools, open the checkpointer and build the agent (once)"""
+        async with self._lock:
+            if self.agent is not None:
+                return
+            self.loop = asyncio.get_running_loop()
+            # One MCP session per server for the lifetime of the runtime
+            self.sessions = await self._exit_stack.enter_async_context(PersistentSessions(client))
+            all_tools = await get_cached_tools(self.sessions, TOOL_CACHE, tool_cache)
+            saver = await get_checkpointer()
+            self.agent = create_react_agent(
+                model=model,
+                tools=all_tools,
+                prompt=dynamic_prompt,  # System prompt is injected per turn
+                debug=False,
+                checkpointer=saver,  # Enable memory (Checkpoint) feature
+            )
+
+    async def close(self):
+        """Close the MCP sessions"""
+        await self._exit_stack.aclose()
+        self.agent = None
+        self.sessions = None
+
+async def get_runtime():
+    """Return the process-wide agent runtime, building it on first use.
+
+    The checkpointer connection belongs to the event loop it was opened on,
+    so a new runtime is built if the caller runs on a different loop.
+    """
+    global _runtime
+    loop = asyncio.get_running_loop()
+    if _runtime is None or (_runtime.loop is not None and _runtime.loop is not loop):
+        _runtime = AgentRuntime()
+    await _runtime.start()
+    return _runtime
+
+async def close_runtime():
+    """Close the agent runtime and checkpointer, e.g. before the event loop exits"""
+    global _runtime
+    await history.close()
+    if _runtime is not None:
+        await _runtime.close()
+        _runtime = None
+    await close_checkpointer()
+
+# Tool outputs streamed to the UI are cut to this many characters
+TOOL_OUTPUT_PREVIEW_CHARS = 1500
+# Full outputs kept for "load full output", per conversation thread, so
+# one busy session can't evict everyone else's
+TOOL_OUTPUT_PER_THREAD = 32
+# Total characters kept across all threads; the oldest outputs go first
+TOOL_OUTPUT_STORE_CHARS = 64_000_000
+
+class ToolOutputStore:
+    """Bounded side store of full tool outputs, keyed by step id.
+
+    The stream only carries a preview of each tool output; the full text is
+    kept here so the UI can fetch it on demand instead of holding every Tako
+    payload in its session state. Each thread keeps its newest
+    `max_per_thread` outputs, and the whole store at most `max_chars`
+    characters.
+    """
+
+    def __init__(self, max_per_thread=TOOL_OUTPUT_PER_THREAD, max_chars=TOOL_OUTPUT_STORE_CHARS):
+        self.max_per_thread = max_per_thread
+        self.max_chars = max_chars
+        self.chars = 0
+        # step_id -> (thread_id, output), oldest first
+        self._outputs = OrderedDict()
+        # thread_id -> step ids of that thread, oldest first
+        self._threads = {}
+        # Written on the agent's event loop, read from the UI thread
+        self._lock = threading.Lock()
+
+    def _drop(self, step_id):
+        thread_id, output = self._outputs.pop(step_id)
+        self.chars -= len(output)
+        steps = self._threads[thread_id]
+        del steps[step_id]
+        if not steps:
+            del self._threads[thread_id]
+
+    def put(self, thread_id, step_id, output):
+        with self._lock:
+            if step_id in self._outputs:
+                self._drop(step_id)
+            self._outputs[step_id] = (thread_id, output)
+            self.chars += len(output)
+            steps = self._threads.setdefault(thread_id, OrderedDict())
+            steps[step_id] = None
+            while len(steps) > self.max_per_thread:
+                self._drop(next(iter(steps)))
+            while self.chars > self.max_chars and self._outputs:
+                self._drop(next(iter(self._outputs)))
+
+    def get(self, thread_id, step_id):
+        with self._lock:
+            stored = self._outputs.get(step_id)
+        # Only the thread that produced an output can read it back
+        if stored is None or stored[0] != thread_id:
+            return None
+        return stored[1]
+
+tool_outputs = ToolOutputStore()
+
+def tool_output_text(output):
+    """Return the text of a tool output (a ToolMessage, content blocks or any object)"""
+    content = getattr(output, "content", output)
+    if isinstance(content, list):
+        content = "\n".join(block.get("text", "") if isinstance(block, dict) else str(block) for block in content)
+    return content if isinstance(content, str) else str(content)
+
+def get_tool_output(thread_id, step_id):
+    """Return the full output of a streamed tool step, or None if it was evicted"""
+    return tool_outputs.get(str(thread_id), step_id)
+
+async def stream_agent_response(user_input, thread_id=DEFAULT_THREAD_ID):
+    """Stream agent response for Streamlit frontend
+
+    Args:
+        user_input: The user's message.
+        thread_id: Conversation to continue; use one per user/browser session
+            so sessions don't share (and grow) a single history.
+    """
     input_data = {"messages": [{"role": "user", "content": user_input}]}
-    thread = {"configurable": {"thread_id": 1}}
-    all_tools = await client.get_tools()
+    # Build/reuse the runtime, then get the enhanced prompt over its MCP session
+    runtime = await get_runtime()
+    enhanced_prompt = await get_enhanced_prompt(user_input, runtime.sessions)
+    thread = {"configurable": {"thread_id": str(thread_id), SYSTEM_PROMPT_KEY: enhanced_prompt}}
     
-    # Get enhanced prompt using MCP
-    enhanced_prompt = await get_enhanced_prompt(user_input)
-    
-    async with AsyncSqliteSaver.from_conn_string("checkpoint/tako_checkpoint.sqlite") as saver:
-        # Your code here
-        agent = create_react_agent(
-            model=model,
-            tools=all_tools,
-            prompt=enhanced_prompt,  # Use the enhanced prompt instead of basic one
-            debug=False,
-            checkpointer=saver,  # Enable memory (Checkpoint) feature
-        )
+    # Stream the response and yield structured data
+    async for event in runtime.agent.astream_events(input_data, version="v2", config=thread):
+        event_type = event["event"]
+        # History summaries are internal model calls, not part of the answer
+        if SUMMARY_TAG in event.get("tags", []):
+            continue
         
-        # Stream the response and yield structured data
-        async for event in agent.astream_events(input_data, version="v2", config=thread):
-            event_type = event["event"]
-            
-            if event_type == "on_chat_model_stream":
-                chunk = event["data"]["chunk"]
-                if hasattr(chunk, 'content') and chunk.content:
-                    yield {
-                        "type": "text",
-                        "content": chunk.content
-                    }
-                    
-            elif event_type == "on_tool_start":
-                tool_name = event["name"]
-                tool_input = event.get("data", {}).get("input", {})
-                yield {
-                    "type": "tool_start",
-                    "tool_name": tool_name,
-                    "input": tool_input
-                }
-                
-            elif event_type == "on_tool_end":
-                tool_name = event["name"]
-                tool_output = event.get("data", {}).get("output", "No output")
-                yield {
-                    "type": "tool_end",
-                    "tool_name": tool_name,
-                    "output": tool_output
-                }
-                
-            elif event_type == "on_chain_start":
-                chain_name = event.get("name", "Unknown")
-                yield {
-                    "type": "chain_start",
-                    "chain_name": chain_name
-                }
-                
-            elif event_type == "on_chain_end":
-                chain_name = event.get("name", "Unknown")
-                yield {
-                    "type": "chain_end",
-                    "chain_name": chain_name
-                }
-                
-            elif event_type == "on_llm_start":
+        if event_type == "on_chat_model_stream":
+            chunk = event["data"]["chunk"]
+            if hasattr(chunk, 'content') and chunk.content:
                 yield {
-                    "type": "llm_start"
+                    "type": "text",
+                    "content": chunk.content
                 }
                 
-            elif event_type == "on_llm_end":
-                yield {
-                    "type": "llm_end"
-                }
+        elif event_type == "on_tool_start":
+            tool_name = event["name"]
+            tool_input = event.get("data", {}).get("input", {})
+            yield {
+                "type": "tool_start",
+                "tool_name": tool_name,
+                "input": tool_input
+            }
+            
+        elif event_type == "on_tool_end":
+            tool_name = event["name"]
+            tool_output = tool_output_text(event.get("data", {}).get("output", "No output"))
+            # Stream a preview; the full output is fetched by step id on demand
+            step_id = event.get("run_id")
+            truncated = len(tool_output) > TOOL_OUTPUT_PREVIEW_CHARS
+            if truncated and step_id is not None:
+                tool_outputs.put(str(thread_id), step_id, tool_output)
+            yield {
+                "type": "tool_end",
+                "tool_name": tool_name,
+                "output": tool_output[:TOOL_OUTPUT_PREVIEW_CHARS],
+                "step_id": step_id,
+                "truncated": truncated,
+                "size": len(tool_output)
+            }
+            
+        elif event_type == "on_chain_start":
+            chain_name = event.get("name", "Unknown")
+            yield {
+                "type": "chain_start",
+                "chain_name": chain_name
+            }
+            
+        elif event_type == "on_chain_end":
+            chain_name = event.get("name", "Unknown")
+            yield {
+                "type": "chain_end",
+                "chain_name": chain_name
+            }
+            
+        elif event_type == "on_llm_start":
+            yield {
+                "type": "llm_start"
+            }
+            
+        elif event_type == "on_llm_end":
+            yield {
+                "type": "llm_end"
+            }
+
+    # Extend the history summary for the next turn, off the critical path
+    state = await runtime.agent.aget_state(thread)
+    history.refresh(str(thread_id), state.values.get("messages", []))
 
 
 # Run the agent
-async def run_agent(client = client):
+async def run_agent(client = client, thread_id=DEFAULT_THREAD_ID):
     # Keep sessions alive during agent execution
-    all_tools = await client.get_tools()
-    print(all_tools)
     user_input = "Show me a chart of Japan's GDP growth over the last 10 years"
-    async with AsyncSqliteSaver.from_conn_string("checkpoint/tako_checkpoint.sqlite") as saver:
-    # Your code here
-        enhanced_prompt = await get_enhanced_prompt(user_input)
-        agent = create_react_agent(
-            model=model,
-            tools=all_tools,
-            debug=False,
-            prompt=enhanced_prompt,
-            checkpointer=saver,  # Enable memory (Checkpoint) feature
-        )
-        thread = {"configurable": {"thread_id": 1}}
-        # Example Tako question that searches and shows a visualization:
-        tako_response = await agent.ainvoke({"messages":[{"role": "user", "content": user_input}]}, thread)
+    runtime = await get_runtime()
+    enhanced_prompt = await get_enhanced_prompt(user_input, runtime.sessions)
+    thread = {"configurable": {"thread_id": str(thread_id), SYSTEM_PROMPT_KEY: enhanced_prompt}}
+    # Example Tako question that searches and shows a visualization:
+    tako_response = await runtime.agent.ainvoke({"messages":[{"role": "user", "content": user_input}]}, thread)
+    history.refresh(str(thread_id), tako_response["messages"])
     return tako_response["messages"][-1].content
 
 async def test_prompt_tools(client=client):
@@ -206,7 +559,32 @@ async def test_prompt_tools(client=client):
         print("Prompt preview:", str(prompt)[:200] + "...")
     except Exception as e:
         print(f"❌ Error getting prompt: {e}")
+
+async def main(args):
+    try:
+        if args.command == "clear":
+            await clear_chat_history_async(args.thread_id)
+        elif args.command == "compact":
+            stats = await compact_checkpoints(args.keep_last, args.thread_id)
+            print(
+                f"✅ Deleted {stats['checkpoints_deleted']} checkpoints and {stats['writes_deleted']} writes; "
+                f"{stats['bytes_before'] / 1e6:.1f} MB -> {stats['bytes_after'] / 1e6:.1f} MB"
+            )
+        else:
+            print(await run_agent(thread_id=args.thread_id))
+    finally:
+        await close_runtime()
+
 if __name__ == "__main__":
-    print(asyncio.run((run_agent())))
-    # asyncio.run(test_prompt_tools())
-    # asyncio.run(clear_chat_history_async(1))
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Tako agent and checkpoint maintenance")
+    subparsers = parser.add_subparsers(dest="command")
+    parser.set_defaults(thread_id=DEFAULT_THREAD_ID)
+    run_parser = subparsers.add_parser("run", help="Run the example agent query (default)")
+    run_parser.add_argument("--thread-id", default=DEFAULT_THREAD_ID, help="Conversation thread to use")
+    clear_parser = subparsers.add_parser("clear", help="Delete the chat history of a thread")
+    clear_parser.add_argument("thread_id", help="Thread to clear")
+    compact_parser = subparsers.add_parser("compact", help="Prune old checkpoints and vacuum the database")
+    compact_parser.add_argument("--keep-last", type=int, default=CHECKPOINT_KEEP_LAST, help="Checkpoints to keep per thread")
+    compact_parser.add_argument("--thread-id", default=None, help="Only compact this thread")
+    asyncio.run(main(parser.parse_args()))
+    # asyncio.run(test_prompt_tools())
\ No newline at end of file